@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_archive.py
+原始 HTML 存档：每个抓到的商品页压缩保存为 html_archive/<站点>/<ASIN>/<时间>.json.gz
+（内容为 {"site", "url", "ts", "html"}）。
+Amazon 改版导致字段变成 “—” 时，修好解析规则后用 --reparse 直接重新解析存档，不必重新抓取。
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+
+from firemaple_parse import ASIN_RE, get_asin_from_url, parse_product
+
+ARCHIVE_DIR = "html_archive"
+
+
+def archive_key(url, row=None):
+    """存档目录名：优先用解析出的 ASIN，其次链接里的 ASIN，都没有时用链接的 sha1"""
+    asin = (row or {}).get("亚马逊ASIN")
+    if asin and ASIN_RE.fullmatch(asin):
+        return asin
+    return get_asin_from_url(url) or "unknown-" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+
+
+def save_page(site, url, html, row=None, root=ARCHIVE_DIR):
+    """压缩保存一个页面（先写临时文件再改名，进程被杀也不会留下半个文件）"""
+    ts = time.strftime("%Y%m%d-%H%M%S")
+    folder = os.path.join(root, site, archive_key(url, row))
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, ts + ".json.gz")
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump({"site": site, "url": url, "ts": ts, "html": html}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def iter_archive(sites, since=None, root=ARCHIVE_DIR):
+    """按 站点 / ASIN / 时间 顺序列出存档文件；since 如 "20261001"，只要该时间之后的"""
+    for site in sites:
+        base = os.path.join(root, site)
+        if not os.path.isdir(base):
+            continue
+        for key in sorted(os.listdir(base)):
+            folder = os.path.join(base, key)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".json.gz") and (not since or name >= since):
+                    yield os.path.join(folder, name)
+
+
+def load_page(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def reparse_file(path):
+    """在解析进程中执行：读取一个存档并用当前的解析规则重新解析，返回 (站点, 链接, 结果行)"""
+    try:
+        page = load_page(path)
+        return page["site"], page["url"], parse_product(page["html"], page["url"], page["site"])
+    except Exception as e:
+        print(f"[ERROR] {path} 重新解析失败：{e}")
+        return None, None, None
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_bench.py
+解析基准 + 准确率检查：用 bench_fixtures/ 里保存的 US / UK / AU 商品页
+（tabular buybox、旧式 Ships from / Sold by、只有 merchant-info、缺货无价格、detail bullets 里的 ASIN 等写法），
+统计各字段解析耗时、每秒解析页数，以及与 expected.json 中期望值相比的字段准确率。
+其中 <站点>_*.html 是只含相关区块的小片段，用来覆盖各种写法；<站点>_full_page.html.gz 是整页规模的页面
+（约 1 MB、2 万多个节点，带导航、脚本、推荐轮播等干扰），耗时以整页的结果为准，单独打印一行。
+
+出现回退时以非 0 状态退出：
+  - 原本正确的字段解析错了（expected.json 中 known_wrong 列出的是已知问题，不算回退）
+  - 有基准时，每页耗时比基准慢超过 --tolerance
+
+耗时门槛需要主动开启：基准（bench_fixtures/baseline.json）和机器有关，不提交到仓库，干净的检出里没有。
+在同一台机器上先 --save-baseline，之后用 --gate 检查；--gate 时没有基准直接以非 0 状态退出，不会悄悄跳过。
+
+用法：
+    python firemaple_bench.py                    # 跑一遍并报告（有基准时顺带对比）
+    python firemaple_bench.py --save-baseline    # 把本机当前耗时存为基准
+    python firemaple_bench.py --gate             # 必须有基准，慢超过 --tolerance 即失败
+    python firemaple_bench.py --rounds 50 --tolerance 0.3
+    python firemaple_bench.py --import-archive html_archive/us/B0XXXXXXXX/20261001-120000.json.gz
+
+新增页面写法时：把页面存为 bench_fixtures/<站点>_<说明>.html（整页可压缩为 .html.gz），并在 expected.json 里写上链接和期望字段。
+抓取时存档的真实页面可以用 --import-archive 直接加进来：期望值先取当前解析结果，核对无误后再提交。
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+from firemaple_archive import load_page
+from firemaple_parse import PARSE_FIELDS, get_asin_from_url, normalize_seller_name, parse_product
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+EXPECTED_PATH = os.path.join(FIXTURE_DIR, "expected.json")
+BASELINE_PATH = os.path.join(FIXTURE_DIR, "baseline.json")
+
+FULL_PAGE_BYTES = 200_000  # 超过这个大小的页面算整页，单独统计耗时
+
+# 不是从页面解析出来的字段（链接原样带回），不参与耗时统计
+TIMED_FIELDS = ["建索引"] + [f for f in PARSE_FIELDS if f != "链接"]
+
+
+def read_fixture(name):
+    path = os.path.join(FIXTURE_DIR, name)
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+def load_cases():
+    with open(EXPECTED_PATH, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    for name, case in cases.items():
+        case["html"] = read_fixture(name)
+    return cases
+
+
+def import_archive(paths):
+    """把 html_archive/ 里的存档页面加为基准页面：期望值取当前解析结果（提交前请人工核对）"""
+    with open(EXPECTED_PATH, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    for path in paths:
+        page = load_page(path)
+        name = f"{page['site']}_archive_{get_asin_from_url(page['url']) or page['ts']}.html.gz"
+        with gzip.open(os.path.join(FIXTURE_DIR, name), "wt", encoding="utf-8") as f:
+            f.write(page["html"])
+        row = parse_product(page["html"], page["url"], page["site"])
+        row["店铺名称"] = normalize_seller_name(row["店铺名称"])
+        cases[name] = {
+            "site": page["site"],
+            "url": page["url"],
+            "layout": f"抓取存档 {page['ts']}（期望值为导入时的解析结果，待核对）",
+            "expected": {k: row.get(k) for k in PARSE_FIELDS},
+        }
+        print(f"[BENCH] 已导入 {path} -> bench_fixtures/{name}，请核对 expected.json 中的期望值")
+    with open(EXPECTED_PATH, "w", encoding="utf-8") as f:
+        json.dump(cases, f, ensure_ascii=False, indent=2)
+
+
+def run_case(case, rounds):
+    """解析 rounds 次：返回 (结果, 每页平均耗时, {字段: 每页平均耗时})"""
+    timings = {}
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        row = parse_product(case["html"], case["url"], case["site"], timings)
+    elapsed = (time.perf_counter() - t0) / rounds
+    row["店铺名称"] = normalize_seller_name(row["店铺名称"])  # 导出时同样会清洗
+    return row, elapsed, {k: v / rounds for k, v in timings.items()}
+
+
+def check_case(row, case):
+    """返回 (错误字段, 回退字段, 已修复的已知问题)"""
+    wrong = [k for k in PARSE_FIELDS if row.get(k) != case["expected"].get(k)]
+    known = set(case.get("known_wrong", ()))
+    return wrong, [k for k in wrong if k not in known], sorted(known - set(wrong))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fire-Maple 商品页解析基准 + 准确率检查")
+    parser.add_argument("--rounds", type=int, default=20, help="每个页面重复解析的次数")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许比基准慢的比例（0.25 = 25%%）")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次耗时保存为基准")
+    parser.add_argument("--gate", action="store_true", help="必须和基准对比（没有基准时失败），用于 CI / 提交前检查")
+    parser.add_argument("--import-archive", nargs="+", metavar="JSON_GZ", help="把抓取存档加为基准页面后退出")
+    args = parser.parse_args(argv)
+
+    if args.import_archive:
+        import_archive(args.import_archive)
+        return 0
+
+    cases = load_cases()
+    field_time = dict.fromkeys(TIMED_FIELDS, 0.0)
+    field_ok = dict.fromkeys(PARSE_FIELDS, 0)
+    site_ok, site_total = {}, {}
+    total_time = 0.0
+    full_times = []
+    regressions, fixed = [], []
+
+    print(f"[BENCH] {len(cases)} 个页面，每页解析 {args.rounds} 次")
+    for name, case in cases.items():
+        row, elapsed, timings = run_case(case, args.rounds)
+        total_time += elapsed
+        if len(case["html"]) >= FULL_PAGE_BYTES:
+            full_times.append(elapsed)
+        for k in TIMED_FIELDS:
+            field_time[k] += timings.get(k, 0.0)
+
+        wrong, regressed, now_fixed = check_case(row, case)
+        for k in PARSE_FIELDS:
+            field_ok[k] += k not in wrong
+        site = case["site"]
+        site_ok[site] = site_ok.get(site, 0) + len(PARSE_FIELDS) - len(wrong)
+        site_total[site] = site_total.get(site, 0) + len(PARSE_FIELDS)
+
+        status = "OK" if not regressed else "回退"
+        print(f"  {name:<26} {elapsed * 1000:6.2f} ms  {len(PARSE_FIELDS) - len(wrong):>2}/{len(PARSE_FIELDS)} 正确  [{status}]  {case['layout']}")
+        for k in wrong:
+            tag = "已知问题" if k not in regressed else "错误"
+            print(f"      {tag} {k}：解析为 {row.get(k)!r}，期望 {case['expected'].get(k)!r}")
+        regressions += [f"{name} {k}" for k in regressed]
+        fixed += [f"{name} {k}" for k in now_fixed]
+
+    n = len(cases)
+    print("\n字段                 每页耗时      准确率")
+    for k in TIMED_FIELDS:
+        acc = f"{field_ok[k] / n:.0%}" if k in field_ok else ""
+        print(f"  {k:<16} {field_time[k] / n * 1e6:8.0f} µs   {acc:>6}")
+    for site in site_total:
+        print(f"  {site.upper()} 字段准确率：{site_ok[site] / site_total[site]:.1%}")
+    ms_per_page = total_time / n * 1000
+    print(f"[BENCH] 平均每页 {ms_per_page:.2f} ms，{1000 / ms_per_page:.0f} 页/秒")
+    full_ms = sum(full_times) / len(full_times) * 1000 if full_times else None
+    if full_ms is not None:
+        print(f"[BENCH] 整页（{len(full_times)} 个）平均 {full_ms:.1f} ms，{1000 / full_ms:.1f} 页/秒")
+
+    if fixed:
+        print(f"[BENCH] 已知问题已修复，可从 expected.json 的 known_wrong 中移除：{', '.join(fixed)}")
+
+    failed = bool(regressions)
+    if regressions:
+        print(f"[FAIL] 字段准确率回退：{', '.join(regressions)}")
+
+    if args.save_baseline:
+        baseline = {
+            "ms_per_page": round(ms_per_page, 4),
+            "full_page_ms": round(full_ms, 4) if full_ms is not None else None,
+            "fields_us": {k: round(field_time[k] / n * 1e6, 1) for k in TIMED_FIELDS},
+        }
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] 已保存基准：{BASELINE_PATH}")
+    elif args.gate and not os.path.exists(BASELINE_PATH):
+        failed = True
+        print(f"[FAIL] --gate 需要基准：先在本机运行 --save-baseline（{BASELINE_PATH} 不存在）")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        limit = baseline["ms_per_page"] * (1 + args.tolerance)
+        change = ms_per_page / baseline["ms_per_page"] - 1
+        print(f"[BENCH] 对比基准 {baseline['ms_per_page']:.2f} ms/页：{change:+.0%}")
+        if ms_per_page > limit:
+            failed = True
+            slower = [
+                k for k in TIMED_FIELDS
+                if field_time[k] / n * 1e6 > baseline["fields_us"].get(k, 0) * (1 + args.tolerance)
+            ]
+            print(f"[FAIL] 解析变慢超过 {args.tolerance:.0%}（变慢的字段：{', '.join(slower) or '无明显单项'}）")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_check.py
+抓取日志等非解析逻辑的自检（解析速度和准确率见 firemaple_bench.py）。
+每项检查在临时目录里构造场景，出错时打印 [FAIL] 并以非 0 状态退出。
+
+用法：
+    python firemaple_check.py
+"""
+
+import sys
+import tempfile
+
+from firemaple_journal import REPARSE_PREFIX, RunJournal
+
+URL_A = "https://www.amazon.com/dp/B07YXZB8F5"
+URL_B = "https://www.amazon.com/dp/B0ORCA4595"
+ROW = {"链接": URL_A, "店铺名称": "Fire-Maple Outdoor", "价格": "$69.99"}
+
+
+def check_journal_truncated_tail():
+    """崩溃时最后一行断在中文字符中间：读取跳过半行，续写时先补换行，不影响前后记录；返回错误说明，正常返回 None"""
+    with tempfile.TemporaryDirectory() as root:
+        journal = RunJournal("20261001-000000", root=root, fsync=False)
+        journal.append("us", 0, URL_A, ROW)
+        journal.close()
+        with open(journal.path("us"), "rb") as f:
+            line = f.read()
+        cut = line.index("店".encode("utf-8")) + 1  # 断在“店”的 3 个字节中间
+        with open(journal.path("us"), "ab") as f:
+            f.write(line[:cut])
+
+        journal = RunJournal("20261001-000000", root=root, fsync=False)
+        try:
+            records = journal.records("us")
+        except UnicodeDecodeError as e:
+            return f"读取半行时出错：{e}"
+        if len(records) != 1:
+            return f"读到 {len(records)} 条记录，应为 1 条"
+        journal.append("us", 1, URL_B, dict(ROW, 链接=URL_B))
+        journal.close()
+        rows = RunJournal("20261001-000000", root=root).rows("us")
+    if [r["链接"] for r in rows] != [URL_A, URL_B]:
+        return f"续写后读到 {[r['链接'] for r in rows]}，应为 [{URL_A}, {URL_B}]"
+    return None
+
+
+def check_journal_latest():
+    """先抓取、再 --reparse、再抓取：RunJournal.latest() 应返回最后一次抓取运行；返回错误说明，正常返回 None"""
+    with tempfile.TemporaryDirectory() as root:
+        for run_id in ("20261001-000000", REPARSE_PREFIX + "20261001-000000", "20261018-090000"):
+            RunJournal(run_id, root=root)
+        latest = RunJournal.latest(root)
+    if latest != "20261018-090000":
+        return f"RunJournal.latest() 返回 {latest}，应为 20261018-090000"
+    return None
+
+
+CHECKS = [
+    ("抓取日志：--reparse 之后最近一次运行仍是抓取运行", check_journal_latest),
+    ("抓取日志：半行断在多字节字符中间", check_journal_truncated_tail),
+]
+
+
+def main():
+    failed = False
+    for name, check in CHECKS:
+        error = check()
+        if error:
+            failed = True
+            print(f"[FAIL] {name}：{error}")
+        else:
+            print(f"[OK] {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_export.py
+导出结果：CSV，以及首列嵌入主图缩略图的 .xlsx（含图片并发下载和缩略图磁盘缓存）
+  - CsvSink / XlsxSink：流式输出，抓到一条写一条，内存不随行数增长
+  - JsonlSink / ParquetSink：评论等明细数据的流式输出（Parquet 需要 pyarrow）
+  - save_csv / save_xlsx_with_images：已有完整结果列表时一次性导出
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import hashlib
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from PIL import Image as PILImage
+
+# ============ 图片下载配置 ============
+IMAGE_WORKERS = 16     # 同时下载的图片数
+IMAGE_PER_HOST = 8     # 同一图片域名最多同时占用的连接数
+IMAGE_TIMEOUT = 10     # 单张图片超时（秒）
+THUMB_CACHE_DIR = "thumb_cache"   # 缩略图磁盘缓存目录（按图片 URL 存取，多次导出共用）
+THUMB_CACHE_MAX_MB = 200          # 缓存容量上限，超出后按最久未使用淘汰
+
+# 输出字段（CSV / Excel 列顺序）
+COLUMNS = ["产品图片", "链接", "亚马逊ASIN", "价格", "类目&排名", "评分", "店铺名称", "是否FBA", "rating数量", "review情况"]
+
+
+# ============ 图片并发预下载 ============
+# 下载图片用的简单 headers
+IMAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36"
+}
+
+
+def prefetch_images(urls, workers=IMAGE_WORKERS, per_host=IMAGE_PER_HOST, timeout=IMAGE_TIMEOUT):
+    """
+    生成 Excel 之前并发下载全部主图：
+    - 同一个 requests.Session 复用连接（keep-alive 连接池）
+    - 线程池限制总并发；每个域名的连接池大小为 per_host，满了就排队等待
+    返回 {图片 URL: 图片字节}，下载失败的 URL 不在结果里
+    """
+    todo = list(dict.fromkeys(u for u in urls if u and u != "—"))
+    if not todo:
+        return {}
+
+    session = requests.Session()
+    session.headers.update(IMAGE_HEADERS)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=per_host, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def fetch(url):
+        try:
+            r = session.get(url, timeout=timeout)
+            r.raise_for_status()
+            return url, r.content
+        except requests.RequestException:
+            return url, None
+
+    with session, ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+        results = dict(tqdm(pool.map(fetch, todo), total=len(todo), desc="下载图片", unit="img"))
+    return {u: b for u, b in results.items() if b}
+
+
+# ============ 缩略图缓存 ============
+def make_thumbnail(img_data, size=(120, 120)):
+    """原图字节 -> 缩略图 JPEG 字节"""
+    with PILImage.open(io.BytesIO(img_data)) as im:
+        im = im.convert("RGB")
+        im.thumbnail(size)  # 控制缩略图大小
+        buf = io.BytesIO()
+        im.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+class ThumbCache:
+    """
+    缩略图磁盘缓存：
+    - 文件名 = 图片 URL 的 sha1，内容为 make_thumbnail 生成的 JPEG
+    - 命中时刷新文件修改时间，超过容量上限时按修改时间淘汰最久未用的（LRU）
+    """
+
+    def __init__(self, root=THUMB_CACHE_DIR, max_mb=THUMB_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = self.misses = self.evicted = 0
+        self.captured = 0  # 抓取时直接写入的数量（浏览器已加载的主图 / 直取时用 context.request 下载）
+
+    def _path(self, url):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest + ".jpg")
+
+    def __contains__(self, url):
+        return os.path.exists(self._path(url))
+
+    def file(self, url):
+        """命中时返回缓存文件路径，未命中返回 None"""
+        path = self._path(url)
+        try:
+            os.utime(path)  # 记录最近使用时间
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, url, data):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的开始删除"""
+        files, total = [], 0
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith(".jpg"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evicted += 1
+
+    def report(self):
+        looked_up = self.hits + self.misses
+        if looked_up:
+            print(
+                f"[CACHE] 缩略图缓存：命中 {self.hits}，未命中 {self.misses}"
+                f"（命中率 {self.hits / looked_up:.0%}），淘汰 {self.evicted}，"
+                f"抓取时直接写入 {self.captured}"
+            )
+
+
+def download_thumbnails(urls, cache, chunk=500):
+    """
+    并发下载缓存中没有的主图，生成缩略图写入缓存。
+    按 chunk 分批下载，原图字节用完即丢，内存不随图片数量增长。
+    返回 {图片 URL: 缓存文件路径}，下载失败或图片损坏的不在结果里
+    """
+    todo = list(dict.fromkeys(u for u in urls if u and u != "—"))
+    paths = {}
+    for i in range(0, len(todo), chunk):
+        for url, img_data in prefetch_images(todo[i:i + chunk]).items():
+            try:
+                paths[url] = cache.put(url, make_thumbnail(img_data))
+            except Exception:
+                continue
+    return paths
+
+
+# ============ 流式输出（边抓边写，内存不随行数增长） ============
+class CsvSink:
+    """逐行写 CSV（utf-8-sig，列顺序默认同 COLUMNS）；第一行到达时才创建文件，每行写完即 flush"""
+
+    def __init__(self, csv_path, columns=COLUMNS):
+        self.path = csv_path
+        self.columns = columns
+        self.count = 0
+        self._f = self._writer = None
+
+    def write(self, row):
+        if self._f is None:
+            self._f = open(self.path, "w", encoding="utf-8-sig", newline="")
+            self._writer = csv.DictWriter(self._f, fieldnames=self.columns, extrasaction="ignore")
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._f.flush()
+        self.count += 1
+
+    def close(self):
+        if self._f is None:
+            return
+        self._f.close()
+        print(f"[DONE] 共保存 {self.count} 条到 CSV：{self.path}")
+
+
+class JsonlSink:
+    """逐行追加 JSONL（文件已存在时接着写，增量运行的结果累积在同一个文件里）；每行写完即 flush"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._f = None
+
+    def write(self, record):
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self.count += 1
+
+    def close(self):
+        if self._f is None:
+            return
+        self._f.close()
+        print(f"[DONE] 共追加 {self.count} 条到 JSONL：{self.path}")
+
+
+class ParquetSink:
+    """
+    按批写 Parquet：每攒够 batch 行写一个 row group，内存里最多只有一批。
+    Parquet 文件不能追加，所以每次运行写一个新文件（文件名带时间）；所有列按字符串保存（None 为空值）
+    """
+
+    def __init__(self, path, columns, batch=1000):
+        import pyarrow as pa  # 可选依赖，只有输出 Parquet 时才需要
+        import pyarrow.parquet as pq
+
+        self._pa, self._pq = pa, pq
+        self.path = path
+        self.columns = columns
+        self.batch = batch
+        self.count = 0
+        self._schema = pa.schema([(c, pa.string()) for c in columns])
+        self._buf = []
+        self._writer = None
+
+    def _flush(self):
+        if not self._buf:
+            return
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, self._schema)
+        data = {c: [None if r.get(c) is None else str(r[c]) for r in self._buf] for c in self.columns}
+        self._writer.write_table(self._pa.Table.from_pydict(data, schema=self._schema))
+        self._buf = []
+
+    def write(self, record):
+        self._buf.append(record)
+        self.count += 1
+        if len(self._buf) >= self.batch:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        if self._writer is None:
+            return
+        self._writer.close()
+        print(f"[DONE] 共保存 {self.count} 条到 Parquet：{self.path}")
+
+
+class XlsxSink:
+    """
+    write-only 模式逐行写 .xlsx，首列嵌入主图缩略图：
+    - 列宽、对齐在写第一行之前按列设置一次，不再逐个单元格回填
+    - 图片按缩略图缓存文件路径引用，保存时才读入，内存不随行数增长
+    - 缓存命中的行立即挂图；未命中的只记下行号，close 时统一并发下载后补上（失败则留空）
+    传入 cache 时由调用方在最后统一打印缓存统计（多个站点共用一个缓存）。
+    """
+
+    def __init__(self, xlsx_path, sheet_title="Fire-Maple", cache=None):
+        self.path = xlsx_path
+        self.sheet_title = sheet_title
+        self.own_cache = cache is None
+        self.cache = cache or ThumbCache()
+        self.count = 0
+        self.timings = {}  # close 时各步骤耗时（秒），供分阶段耗时统计使用
+        self._wb = self._ws = None
+        self._missing = []  # (行号, 图片 URL)
+
+    def _open(self):
+        from openpyxl import Workbook
+        from openpyxl.styles import Alignment
+        from openpyxl.utils import get_column_letter
+
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(self.sheet_title)
+        self._align = Alignment(vertical="center", wrap_text=True)
+
+        # 设置列宽和文字列对齐（首列放缩略图）
+        widths = {1: 18, 2: 42}
+        for col_idx in range(1, len(COLUMNS) + 1):
+            dim = self._ws.column_dimensions[get_column_letter(col_idx)]
+            dim.width = widths.get(col_idx, 20)
+            if col_idx > 1:
+                dim.alignment = self._align
+        self._append(COLUMNS[0], COLUMNS[1:])
+
+    def _append(self, first, values):
+        from openpyxl.cell import WriteOnlyCell
+
+        cells = [first]
+        for value in values:
+            cell = WriteOnlyCell(self._ws, value=value)
+            cell.alignment = self._align
+            cells.append(cell)
+        self._ws.append(cells)
+
+    def _add_image(self, row_idx, path):
+        from openpyxl.drawing.image import Image as XLImage
+
+        self._ws.add_image(XLImage(path), f"A{row_idx}")  # 宽高取缩略图本身尺寸
+
+    def write(self, row):
+        if self._wb is None:
+            self._open()
+        self.count += 1
+        row_idx = self.count + 1  # 第 1 行是表头
+
+        img_url = row.get("产品图片")
+        if img_url and img_url != "—":
+            self._ws.row_dimensions[row_idx].height = 95  # 行高稍微大一点（write-only 模式须在写行之前设置）
+            path = self.cache.file(img_url)
+            if path:
+                self._add_image(row_idx, path)
+            else:
+                self._missing.append((row_idx, img_url))
+
+        # 图片列留空，图片以浮动图片的形式挂在 A 列
+        self._append(None, [row.get(col, "") for col in COLUMNS[1:]])
+        self._ws.row_dimensions.pop(row_idx, None)  # 该行已写出，行高设置不必再留在内存里
+
+    def close(self):
+        if self._wb is None:
+            return
+        t0 = time.perf_counter()
+        paths = download_thumbnails([url for _, url in self._missing], self.cache)
+        for row_idx, url in self._missing:
+            if url in paths:
+                self._add_image(row_idx, paths[url])
+        self._missing.clear()
+        t1 = time.perf_counter()
+
+        self._wb.save(self.path)
+        self.timings = {"下载图片": t1 - t0, "保存Excel": time.perf_counter() - t1}
+        self.cache.evict()  # 保存之后再淘汰，保存时还要读取缓存文件
+        print(f"[DONE] 已生成带图片的 Excel：{self.path}")
+        if self.own_cache:
+            self.cache.report()
+
+
+# ============ 一次性导出（已有完整结果列表时） ============
+def save_xlsx_with_images(rows, xlsx_path, cache=None, sheet_title="Fire-Maple"):
+    """将抓取结果写入 .xlsx，并把“产品图片”嵌入首列缩略图（内部走 XlsxSink）"""
+    sink = XlsxSink(xlsx_path, sheet_title, cache)
+    for row in rows:
+        sink.write(row)
+    sink.close()
+
+
+def save_csv(rows, csv_path):
+    sink = CsvSink(csv_path)
+    for row in rows:
+        sink.write(row)
+    sink.close()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_fetch.py
+请求层：商品页抓取和搜索 / 榜单 / 评论 / 报价各采集阶段共用。
+  - AdaptiveRateLimiter：站点级令牌桶 + AIMD 自适应限速
+  - 风控页识别：验证码 / 狗狗页 / 503 / 429（页面用 check_blocked，直取的 HTML 用 BLOCK_HTML_RE）
+  - 直取 HTML（不渲染）：http_get 用 context.request，InPageFetcher 在停在首页的 page 里 fetch()
+"""
+
+import asyncio
+import re
+import time
+from collections import deque
+
+from firemaple_sites import MARKETPLACES, home_url
+
+# ============ 自适应限速（每个站点一个令牌桶） ============
+RATE_START = 0.5     # 初始速率：同一站点所有页面合计每秒打开的商品页数
+RATE_MIN = 0.05      # 连续遇到验证码 / 503 时最多降到这个速率
+RATE_MAX = 2.0       # 页面一直正常时最多加速到这个速率
+RATE_STEP = 0.02     # 每成功一页速率增加多少（线性加速）
+RATE_BACKOFF = 0.5   # 遇到验证码 / 503 时速率乘以这个系数（成倍减速）
+RATE_BURST = 2       # 令牌桶容量：空闲后最多连续打开几个页面
+RATE_WINDOW = 60     # 进度条上“实际速率”的统计窗口（秒）
+RATE_BACKOFF_HOLD = 10  # 直取遇到验证码时，距上次减速不足这么多秒算同一波，不再重复减速
+BLOCK_RETRIES = 3        # 同一链接遇到验证码 / 狗狗页后最多重新排队几次
+BLOCK_RETRY_DELAY = 15   # 第一次重新排队前等待的秒数，之后每次翻倍
+IN_PAGE_CONCURRENCY = 8  # --in-page 时一个 page 里同时进行的 fetch() 数
+
+
+class AdaptiveRateLimiter:
+    """
+    站点级令牌桶限速 + AIMD 自适应：
+    - 每次打开商品页前取一个令牌；令牌按 rate（次/秒）匀速补充，最多攒 burst 个
+    - 页面正常：rate 加 step（线性加速，直到 max_rate）
+    - 遇到 503 / 429 / 验证码：rate 乘以 backoff（成倍减速，不低于 min_rate），并清空已攒的令牌。
+      多个 worker 同时撞上同一波验证码只应减速一次：换 context 的由 pool.rotate() 的返回值把关，
+      不换 context 的（直取回退浏览器）用 backoff_once()
+    """
+
+    def __init__(self, rate=RATE_START, min_rate=RATE_MIN, max_rate=RATE_MAX, step=RATE_STEP,
+                 backoff=RATE_BACKOFF, burst=RATE_BURST):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.backoff_factor = backoff
+        self.burst = burst
+        self.backoffs = 0
+        self._last_backoff = None
+        self._tokens = 1.0
+        self._last = None
+        self._start = None
+        self._lock = asyncio.Lock()
+        self._sent = deque()  # 最近一段时间的请求时刻，用于计算实际速率
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            if self._last is None:
+                self._start = self._last = loop.time()
+            self._refill(loop.time())
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill(loop.time())
+            self._tokens -= 1
+            self._sent.append(loop.time())
+
+    def success(self):
+        self.rate = min(self.max_rate, self.rate + self.step)
+
+    def backoff(self):
+        self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+        self._tokens = min(self._tokens, 0.0)
+        self.backoffs += 1
+        self._last_backoff = time.monotonic()
+
+    def backoff_once(self, hold=RATE_BACKOFF_HOLD):
+        """距上次减速不足 hold 秒时视为同一波拥塞，不再减速；返回是否减速"""
+        if self._last_backoff is not None and time.monotonic() - self._last_backoff < hold:
+            return False
+        self.backoff()
+        return True
+
+    def effective_rate(self, window=RATE_WINDOW):
+        """最近 window 秒内实际打开页面的速率（次/秒）"""
+        if self._start is None:
+            return 0.0
+        now = asyncio.get_running_loop().time()
+        while self._sent and now - self._sent[0] > window:
+            self._sent.popleft()
+        return len(self._sent) / max(min(window, now - self._start), 1.0)
+
+    def postfix(self):
+        """进度条后缀：实际速率 / 当前目标速率（次/分钟）"""
+        return f"{self.effective_rate() * 60:.0f}/分 目标 {self.rate * 60:.0f}/分"
+
+
+# ============ 风控页识别 ============
+# 导航一结束就在页面里检查一次：验证码（Robot Check）返回 "captcha"，503 狗狗页返回 "dog"，正常页面返回 null
+BLOCK_CHECK_JS = """() => {
+    if (document.querySelector("form[action*='validateCaptcha'], input#captchacharacters")) return "captcha";
+    if (/robot check/i.test(document.title)) return "captcha";
+    if (/sorry! something went wrong/i.test(document.title) && !document.querySelector("#productTitle")) return "dog";
+    return null;
+}"""
+
+
+# 同样的判断用于 HTTP 直取拿到的 HTML（没有 DOM，直接查文本）
+BLOCK_HTML_RE = re.compile(
+    r"validateCaptcha|captchacharacters|<title[^>]*>\s*(?:Robot Check|Sorry! Something went wrong)", re.I
+)
+
+
+class BlockedError(Exception):
+    """Amazon 限流或风控：503 / 429 响应、验证码页、狗狗页"""
+
+
+async def check_blocked(page, resp):
+    """导航结束后立即判断是否被风控，是则抛出 BlockedError（不再空等 30 秒的 #productTitle）"""
+    if resp is not None and resp.status in (429, 503):
+        raise BlockedError(f"HTTP {resp.status}")
+    if "/errors/validateCaptcha" in page.url:
+        raise BlockedError("captcha")
+    kind = await page.evaluate(BLOCK_CHECK_JS)
+    if kind:
+        raise BlockedError(kind)
+
+
+# ============ 直取 HTML（不渲染） ============
+# 在页面里并发 fetch 一组同源链接（带该 context 的全部 cookies），返回 [{status, html}]
+IN_PAGE_FETCH_JS = """async (urls) => Promise.all(urls.map(async (url) => {
+    try {
+        const resp = await fetch(url, {credentials: "include"});
+        return {status: resp.status, html: await resp.text()};
+    } catch (e) {
+        return {status: 0, html: String(e)};
+    }
+}))"""
+
+
+class InPageFetcher:
+    """
+    页面内 fetch：借一个 page 停在站点首页（收货地址 cookies、浏览器指纹都是现成的），
+    用页面里的 fetch() 取回 HTML，不导航、不渲染，最多 concurrency 次 evaluate 同时进行。
+    context 被换掉（SitePages.rotate）后自动在新 context 上重新打开首页
+    """
+
+    def __init__(self, pool, concurrency=IN_PAGE_CONCURRENCY):
+        self.pool = pool
+        self._sem = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._slot = None
+        self._ready_gen = None  # 已打开站点首页的 context 代数
+
+    async def _page(self):
+        async with self._lock:
+            if self._slot is None:
+                self._slot = await self.pool.attach()
+            else:
+                self._slot = await self.pool.refresh(self._slot)
+            page, gen = self._slot[0], self._slot[1]
+            if self._ready_gen != gen:
+                await page.goto(home_url(self.pool.site), timeout=60000, wait_until="domcontentloaded")
+                self._ready_gen = gen
+            return page, gen
+
+    async def fetch_all(self, urls):
+        """一次 evaluate 并发请求一组链接：返回 ([(状态码, HTML)], 所用 context 的代数)"""
+        async with self._sem:
+            page, gen = await self._page()
+            try:
+                results = await page.evaluate(IN_PAGE_FETCH_JS, list(urls))
+            except Exception:
+                self._ready_gen = None  # page 可能已被关闭或跳走，下次重新打开首页
+                raise
+        return [(r["status"], r["html"]) for r in results], gen
+
+    async def get(self, url):
+        (result,), _ = await self.fetch_all([url])
+        return result
+
+    async def close(self):
+        if self._slot:
+            await self.pool.detach(self._slot)
+            self._slot = None
+
+
+def http_get(request, site):
+    """用 context.request（APIRequestContext，共用 cookies）取 HTML：返回 async (链接) -> (状态码, HTML)"""
+
+    async def get(url):
+        resp = await request.get(
+            url,
+            headers={"Accept-Language": f"{MARKETPLACES[site]['locale']},en;q=0.8"},
+            timeout=30000,
+        )
+        return resp.status, await resp.text()
+
+    return get
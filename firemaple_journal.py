@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_journal.py
+抓取日志：每解析完一个商品立即追加一行到 journal/<运行编号>/<站点>.jsonl 并落盘。
+  - 程序崩溃 / 验证码 / Ctrl-C 中断后，--resume 续跑同一次运行，已完成的 ASIN 直接跳过
+  - --rebuild 不用重新抓取，直接从日志重新导出 CSV / Excel
+"""
+
+import os
+import json
+import time
+
+from firemaple_parse import get_asin_from_url
+
+JOURNAL_DIR = "journal"
+REPARSE_PREFIX = "reparse-"  # --reparse 写的日志编号前缀；不算“最近一次运行”，--resume / --rebuild 需指定编号才会用到
+
+
+def item_key(url):
+    """日志去重用的键：能取到 ASIN 用 ASIN，否则用链接本身"""
+    return get_asin_from_url(url) or url
+
+
+class RunJournal:
+    """一次运行的逐条结果日志（每个站点一个 JSONL 文件）"""
+
+    def __init__(self, run_id=None, root=JOURNAL_DIR, fsync=True):
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+        self.fsync = fsync  # 批量重新解析时不必逐行落盘
+        self.dir = os.path.join(root, self.run_id)
+        os.makedirs(self.dir, exist_ok=True)
+        self._files = {}
+        self._done = {}
+
+    @staticmethod
+    def latest(root=JOURNAL_DIR):
+        """最近一次抓取运行的编号（不含 --reparse 的日志），没有返回 None"""
+        if not os.path.isdir(root):
+            return None
+        runs = sorted(
+            d for d in os.listdir(root)
+            if os.path.isdir(os.path.join(root, d)) and not d.startswith(REPARSE_PREFIX)
+        )
+        return runs[-1] if runs else None
+
+    def path(self, site):
+        return os.path.join(self.dir, f"{site}.jsonl")
+
+    def records(self, site):
+        """
+        读取该站点的全部记录；崩溃时写了一半的最后一行直接跳过。
+        按字节读、逐行解码：半行可能断在中文字符中间，文本模式读取会直接抛 UnicodeDecodeError
+        """
+        path = self.path(site)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line.decode("utf-8")))
+                except ValueError:  # 含 UnicodeDecodeError
+                    continue
+        return records
+
+    def done(self, site, url):
+        if site not in self._done:
+            self._done[site] = {r["key"] for r in self.records(site)}
+        return item_key(url) in self._done[site]
+
+    def append(self, site, idx, url, row):
+        """追加一条结果并立即 fsync，保证进程被杀也不会丢已完成的商品"""
+        f = self._files.get(site)
+        if f is None:
+            path = self.path(site)
+            # 上次崩溃留下半行时先补换行，避免和新记录粘在一起（按字节检查，半行可能断在多字节字符中间）
+            broken = False
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                with open(path, "rb") as raw:
+                    raw.seek(-1, os.SEEK_END)
+                    broken = raw.read(1) != b"\n"
+            f = self._files[site] = open(path, "a", encoding="utf-8")
+            if broken:
+                f.write("\n")
+        key = item_key(url)
+        record = {"key": key, "idx": idx, "url": url, "ts": time.time(), "row": row}
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self._done.setdefault(site, set()).add(key)
+
+    def _latest(self, site):
+        """同一商品重复抓取时以最后一次为准"""
+        latest = {}
+        for r in self.records(site):
+            latest[r["key"]] = r
+        return latest
+
+    def rows(self, site):
+        """按链接原顺序返回该站点的结果行"""
+        return [r["row"] for r in sorted(self._latest(site).values(), key=lambda r: r["idx"])]
+
+    def rows_by_key(self, site):
+        """{ASIN 或链接: 结果行}，续跑时按当前链接文件的顺序补写已完成的商品"""
+        return {key: r["row"] for key, r in self._latest(site).items()}
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
@@ -0,0 +1,1039 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_parse.py
+商品页解析：不依赖浏览器，输入 HTML 字符串输出字段字典，各站点共用。
+  - parse_product：lxml 单次遍历解析（抓取时使用）
+  - parse_product_bs4：旧版 BeautifulSoup 解析，保留作对照基准
+  - bench_parse：对比两者耗时与结果
+  - parse_location：读取页面顶部的收货地址，用于判断保存的会话是否仍然有效
+"""
+
+import os
+import re
+import json
+import time
+from datetime import datetime
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+
+from firemaple_sites import MARKETPLACES
+
+# ============ 通用工具 ============
+def clean_text(txt):
+    if not txt:
+        return "—"
+    return re.sub(r"\s+", " ", txt).strip()
+
+
+# ============ ASIN & FBA 辅助函数（各站点通用） ============
+def get_asin_from_url(url):
+    """
+    从 URL 中提取 ASIN，兼容 /dp/、/gp/product/、/gp/aw/d/（手机版）、/product/ 等多种形式
+    """
+    patterns = [
+        r"/dp/([A-Z0-9]{10})",
+        r"/gp/product/([A-Z0-9]{10})",
+        r"/gp/aw/d/([A-Z0-9]{10})",
+        r"/product/([A-Z0-9]{10})",
+    ]
+    for pat in patterns:
+        m = re.search(pat, url)
+        if m:
+            return m.group(1)
+    return None
+
+
+def get_asin_from_page(soup):
+    """
+    从页面详情表格 / detail bullets 中提取 ASIN
+    """
+    # 产品详情表格里找 ASIN
+    tables = soup.select(
+        "table#productDetails_detailBullets_sections1, "
+        "table#productDetails_techSpec_section_1, "
+        "table.prodDetTable"
+    )
+    for table in tables:
+        for row in table.select("tr"):
+            header = row.select_one("th")
+            if not header:
+                continue
+            label = header.get_text(strip=True)
+            if label == "ASIN":
+                val = row.select_one("td")
+                if val:
+                    asin = val.get_text(strip=True)
+                    if re.fullmatch(r"[A-Z0-9]{10}", asin):
+                        return asin
+
+    # detailBullets_feature_div 区域兜底
+    bullets = soup.select("#detailBullets_feature_div li")
+    for li in bullets:
+        label = li.select_one("span.a-text-bold")
+        if label and "ASIN" in label.get_text():
+            text = li.get_text(" ", strip=True)
+            m = re.search(r"([A-Z0-9]{10})", text)
+            if m:
+                return m.group(1)
+
+    return None
+
+
+def get_asin(url, soup):
+    """
+    综合 URL + 页面两种方式获取 ASIN
+    """
+    asin = get_asin_from_url(url)
+    if asin:
+        return asin
+    asin = get_asin_from_page(soup)
+    return asin if asin else "—"
+
+
+FBA_BLOCK_IDS = ("merchant-info", "tabular-buybox", "shipsFromSoldBy_feature_div", "desktop_buybox")
+
+FBA_PATTERNS = [
+    re.compile(r"fulfilled\s+by\s+amazon"),
+    re.compile(r"dispatch(?:es|ed)?\s+from\s+amazon"),   # dispatches from / dispatched from Amazon
+    re.compile(r"ships?\s+from\s+amazon"),
+    re.compile(r"delivered\s+by\s+amazon"),
+    re.compile(r"sold\s+by\s+amazon"),
+]
+
+# fba_rule="strict" 时只认这几种明确写法（原 AU 脚本的判断）
+FBA_STRICT_PHRASES = ("fulfilled by amazon", "ships from amazon", "dispatched by amazon", "delivered by amazon")
+
+
+def detect_fba(soup, ships_from_text, seller_text, rule="loose"):
+    """
+    判断是否 FBA：
+    - 综合 Ships from / Sold by / merchant-info / buybox 等区域
+    - 识别：fulfilled/dispatches/dispatched/ships/delivered/sold ... by/from Amazon
+    返回 "是" 或 "否"
+    """
+    text_blocks = []
+    for el_id in FBA_BLOCK_IDS:
+        el = soup.select_one("#" + el_id)
+        if el:
+            text_blocks.append(el.get_text(" ", strip=True))
+    return classify_fba(ships_from_text, seller_text, text_blocks, rule)
+
+
+def classify_fba(ships_from_text, seller_text, block_texts, rule="loose"):
+    """detect_fba 的判定部分：直接传入各区块文字（解析引擎里已缓存，不必重复查找）"""
+    if rule == "strict":
+        if ships_from_text and ships_from_text != "—" and "amazon" in ships_from_text.lower():
+            return "是"
+        blob = " ".join(block_texts).lower()
+        return "是" if any(k in blob for k in FBA_STRICT_PHRASES) else "否"
+
+    text_blocks = []
+
+    if ships_from_text and ships_from_text != "—":
+        text_blocks.append(ships_from_text)
+
+    if seller_text and seller_text != "—":
+        text_blocks.append(seller_text)
+
+    text_blocks.extend(block_texts)
+    blob = " ".join(text_blocks).lower()
+
+    # 1) 精准匹配各种常见写法
+    for pat in FBA_PATTERNS:
+        if pat.search(blob):
+            return "是"
+
+    # 2) 模糊：包含 amazon 且附近有 dispatch/ship/fulfil/prime 等字样
+    if "amazon" in blob and any(
+        kw in blob for kw in ["dispatch", "ship", "fulfil", "fulfill", "prime", "delivery"]
+    ):
+        return "是"
+
+    # 3) 兜底：ships_from 字段里本身就写了 amazon 也视为 FBA
+    if ships_from_text and "amazon" in ships_from_text.lower():
+        return "是"
+
+    return "否"
+
+
+# ============ 解析引擎（lxml 单次遍历） ============
+# 各站点价格符号 -> 价格文字正则（如 "$12.99"、"£ 8"）
+PRICE_TEXT_RES = {m["currency"]: re.compile(re.escape(m["currency"]) + r"\s?\d") for m in MARKETPLACES.values()}
+
+# 所有字段用到的节点：一次 XPath 遍历全部收集，之后只在这些节点 / 小子树里取值
+WATCH_IDS = (
+    "landingImage", "imgTagWrapperId",
+    "corePrice_feature_div", "apex_desktop", "corePrice_desktop_feature_div", "price_inside_buybox",
+    "acrCustomerReviewText", "acrPopover",
+    "tabular-buybox", "shipsFromSoldBy_feature_div", "desktop_buybox", "rightCol", "buybox_feature_div",
+    "merchant-info",
+    "detailBullets_feature_div", "productDetails_detailBullets_sections1", "productDetails_techSpec_section_1",
+    "prodDetails", "wayfinding-breadcrumbs_feature_div",
+)
+WATCH_HOOKS = ("rating-out-of-text", "average-star-rating", "total-review-count", "review")
+WATCH_CLASSES = (
+    "a-offscreen", "a-price", "a-price-whole", "a-price-fraction", "a-price-symbol", "a-icon-alt", "prodDetTable",
+)
+ASIN_TABLE_IDS = ("productDetails_detailBullets_sections1", "productDetails_techSpec_section_1")
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# 谓词写在属性节点上（@id[. = ...]）比逐个 @id='...' 比较快得多；
+# class 只用互不包含的子串做粗筛（"a-price" 已覆盖 "a-price-whole" 等），精确判断在 PageIndex 里做
+_CLASS_HINTS = [c for c in WATCH_CLASSES if not any(o != c and o in c for o in WATCH_CLASSES)]
+_XP_CANDIDATES = etree.XPath(
+    "//*[@id[" + " or ".join(f".='{i}'" for i in WATCH_IDS) + "]"
+    " or @data-hook[" + " or ".join(f".='{h}'" for h in WATCH_HOOKS) + "]"
+    " or @class[" + " or ".join(f"contains(., '{c}')" for c in _CLASS_HINTS) + "]]"
+)
+# 与 BeautifulSoup.get_text 一致：不含 script/style/template 和注释
+_XP_TEXT = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+_XP_ALL_TEXT = etree.XPath(".//text()")
+_XP_FIRST_IMG = etree.XPath("(.//img)[1]")
+_XP_THUMB_IMG = etree.XPath(f"(//*[@id='altImages']//img | //*[{_has_class('imageThumbnail')}]//img)[1]")
+_XP_FIRST_SPAN = etree.XPath("(.//span)[1]")
+_XP_PRICE_IN = etree.XPath(f"(.//*[{_has_class('a-price')}]//*[{_has_class('a-offscreen')}])[1]")
+_XP_SIZE_BASE = etree.XPath(f"(.//*[{_has_class('a-size-base')}])[1]")
+_XP_BUYBOX_ROWS = etree.XPath(
+    f".//*[{_has_class('tabular-buybox-container')} or {_has_class('tabular-buybox-text-row')}]"
+)
+_XP_BUYBOX_LABEL = etree.XPath(f"(.//*[{_has_class('tabular-buybox-label')}])[1]")
+_XP_BUYBOX_TEXT = etree.XPath(f"(.//*[{_has_class('tabular-buybox-text')}])[1]")
+_XP_NEXT_TAG = etree.XPath(
+    "(descendant::*[self::a or self::span or self::div] | following::*[self::a or self::span or self::div])[1]"
+)
+_XP_ROWS = etree.XPath(".//tr")
+_XP_FIRST_TH = etree.XPath("(.//th)[1]")
+_XP_FIRST_TD = etree.XPath("(.//td)[1]")
+_XP_ITEMS = etree.XPath(".//li")
+_XP_BOLD_LABEL = etree.XPath(f"(.//span[{_has_class('a-text-bold')}])[1]")
+_XP_LINKS = etree.XPath(".//a")
+_XP_REVIEW_TITLE = etree.XPath("(.//span[@data-hook='review-title']//span)[1]")
+_XP_REVIEW_BODY = etree.XPath("(.//span[@data-hook='review-body']//span)[1]")
+
+SHIPS_FROM_LABEL_RE = re.compile(r"^\s*Ships\s*from\s*$", re.I)
+SOLD_BY_LABEL_RE = re.compile(r"^\s*Sold\s*by\s*$", re.I)
+SHIPS_FROM_INLINE_RE = re.compile(r"Ships\s*from\s+([A-Za-z0-9 &\-]+)", re.I)
+SOLD_BY_INLINE_RE = re.compile(r"Sold\s*by\s+(.+?)(?:\s+and|\s+\.|$)", re.I)
+INSTALLMENT_RE = re.compile(r"(installment|emi)", re.I)
+BSR_RE = re.compile(r"Best\s*Sellers?\s*Rank\s*:?\s*(.+?)(?:Date First Available|Customer Reviews|ASIN|$)", re.I)
+ASIN_RE = re.compile(r"[A-Z0-9]{10}")
+
+
+def _one(xpath, el):
+    found = xpath(el)
+    return found[0] if found else None
+
+
+def _text(el, sep="", strip=True):
+    """等价于 BeautifulSoup 的 get_text(sep, strip=strip)"""
+    parts = _XP_TEXT(el)
+    if strip:
+        return sep.join(t.strip() for t in parts if t.strip())
+    return sep.join(parts)
+
+
+def _document(html):
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # 带 XML 编码声明的字符串 lxml 不接受，转成 bytes 再解析
+        return lxml_html.document_fromstring(html.encode("utf-8"))
+
+
+class _Laps:
+    """parse_product 内部分段计时：每次调用把距上一次调用的耗时累加到 timings[名称]；timings 为 None 时什么都不做"""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self._t = time.perf_counter() if timings is not None else 0.0
+
+    def __call__(self, name):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[name] = self.timings.get(name, 0.0) + now - self._t
+        self._t = now
+
+
+class PageIndex:
+    """一次遍历得到的节点索引：id -> 首个节点；data-hook / class -> 按文档顺序的节点列表"""
+
+    def __init__(self, root):
+        self.ids, self.hooks, self.classes = {}, {}, {}
+        self.asin_tables = []
+        self._block_text = {}
+        for el in _XP_CANDIDATES(root):
+            el_id = el.get("id")
+            if el_id in WATCH_IDS:
+                self.ids.setdefault(el_id, el)
+            hook = el.get("data-hook")
+            if hook in WATCH_HOOKS:
+                self.hooks.setdefault(hook, []).append(el)
+            classes = el.get("class", "").split()
+            for c in classes:
+                if c in WATCH_CLASSES:
+                    self.classes.setdefault(c, []).append(el)
+            if el.tag == "table" and (el_id in ASIN_TABLE_IDS or "prodDetTable" in classes):
+                self.asin_tables.append(el)
+
+    def first(self, kind, key, tag=None):
+        for el in getattr(self, kind).get(key, ()):
+            if tag is None or el.tag == tag:
+                return el
+        return None
+
+    def block_text(self, el_id):
+        """按 id 取区块文字（空格拼接），同一区块只计算一次"""
+        if el_id not in self._block_text:
+            el = self.ids.get(el_id)
+            self._block_text[el_id] = _text(el, " ") if el is not None else None
+        return self._block_text[el_id]
+
+
+def _in_span_price(el):
+    """是否位于 span.a-price 之内（对应旧版选择器 "span.a-price .a-offscreen"）"""
+    for anc in el.iterancestors("span"):
+        if "a-price" in anc.get("class", "").split():
+            return True
+    return False
+
+
+def _price_candidates(idx, offscreen):
+    """按旧版选择器顺序依次给出候选价格节点（惰性计算，命中即停）"""
+    for container_id in ("corePrice_feature_div", "apex_desktop", "corePrice_desktop_feature_div"):
+        container = idx.ids.get(container_id)
+        yield _one(_XP_PRICE_IN, container) if container is not None else None
+    yield idx.ids.get("price_inside_buybox")
+    yield next((el for el in offscreen if _in_span_price(el)), None)
+
+
+def _labelled_value(box, label_re, label):
+    """旧式 buybox：找到单独成行的标签文字（如 "Sold by"），取其后第一个 a/span/div 的文字"""
+    lab = next((t for t in _XP_ALL_TEXT(box) if label_re.search(t)), None)
+    if lab is None:
+        return None
+    row = lab.getparent()
+    if lab.is_tail:
+        row = row.getparent()
+    cand = _one(_XP_NEXT_TAG, row if row is not None else box)
+    if cand is None:
+        return None
+    val = clean_text(_text(cand, strip=False))
+    return val if val.lower() != label else None
+
+
+def _asin_from_index(idx):
+    """与 get_asin_from_page 相同的规则，只在索引到的详情表格 / detail bullets 里找"""
+    for table in idx.asin_tables:
+        for row in _XP_ROWS(table):
+            header = _one(_XP_FIRST_TH, row)
+            if header is None or _text(header) != "ASIN":
+                continue
+            val = _one(_XP_FIRST_TD, row)
+            if val is not None and ASIN_RE.fullmatch(_text(val)):
+                return _text(val)
+
+    bullets = idx.ids.get("detailBullets_feature_div")
+    if bullets is not None:
+        for li in _XP_ITEMS(bullets):
+            label = _one(_XP_BOLD_LABEL, li)
+            if label is not None and "ASIN" in _text(label, strip=False):
+                m = ASIN_RE.search(_text(li, " "))
+                if m:
+                    return m.group(0)
+    return None
+
+
+def parse_product(html, url, site="us", timings=None):
+    """
+    lxml 单次遍历解析商品页，字段与 parse_product_bs4 完全一致
+    传入 timings（dict）时把建索引和各字段的耗时（秒）累加进去，供基准测试 / 耗时统计使用
+    """
+    market = MARKETPLACES[site]
+    currency = market["currency"]
+    lap = _Laps(timings)
+    root = _document(html)
+    idx = PageIndex(root)
+    ids = idx.ids
+    lap("建索引")
+
+    data = {}
+
+    # ---------- 产品主图 ----------
+    img_url = None
+    img_el = ids.get("landingImage")
+    if img_el is None and ids.get("imgTagWrapperId") is not None:
+        img_el = _one(_XP_FIRST_IMG, ids["imgTagWrapperId"])
+    if img_el is not None and img_el.get("src"):
+        img_url = img_el.get("src")
+    if not img_url:
+        thumb = _one(_XP_THUMB_IMG, root)
+        if thumb is not None and thumb.get("src"):
+            img_url = thumb.get("src")
+    data["产品图片"] = img_url if img_url else "—"
+    lap("产品图片")
+
+    # ---------- 商品链接 ----------
+    data["链接"] = url
+
+    # ---------- ASIN ----------
+    data["亚马逊ASIN"] = get_asin_from_url(url) or _asin_from_index(idx) or "—"
+    lap("亚马逊ASIN")
+
+    # ---------- 价格 ----------
+    price = None
+    offscreen = idx.classes.get("a-offscreen", ())
+    for el in _price_candidates(idx, offscreen):
+        if el is not None and currency in _text(el, strip=False):
+            price = _text(el)
+            break
+    if not price:
+        for el in offscreen:
+            if el.tag != "span":
+                continue
+            parent = el.getparent()
+            pid = parent.get("id") if parent is not None else ""
+            if pid and INSTALLMENT_RE.search(pid):
+                continue
+            txt = _text(el)
+            if currency in txt and PRICE_TEXT_RES[currency].search(txt) and len(txt) < 24:
+                price = txt
+                break
+    if not price:
+        whole = idx.first("classes", "a-price-whole", "span")
+        frac = idx.first("classes", "a-price-fraction", "span")
+        sym = idx.first("classes", "a-price-symbol", "span")
+        if whole is not None:
+            price = (_text(sym) if sym is not None else currency) + _text(whole)
+            if frac is not None:
+                price += "." + _text(frac)
+    data["价格"] = clean_text(price)
+    lap("价格")
+
+    # ---------- 评分 ----------
+    rating_el = idx.first("hooks", "rating-out-of-text", "span")
+    if rating_el is None:
+        for star in idx.hooks.get("average-star-rating", ()):
+            if star.tag == "i":
+                rating_el = _one(_XP_FIRST_SPAN, star)
+                if rating_el is not None:
+                    break
+    if rating_el is None:
+        rating_el = idx.first("classes", "a-icon-alt", "span")
+    data["评分"] = clean_text(_text(rating_el) if rating_el is not None else None)
+    lap("评分")
+
+    # ---------- review 数量 ----------
+    rc_el = ids.get("acrCustomerReviewText")
+    if rc_el is None:
+        rc_el = idx.first("hooks", "total-review-count")
+    if rc_el is None and ids.get("acrPopover") is not None:
+        rc_el = _one(_XP_SIZE_BASE, ids["acrPopover"])
+    data["rating数量"] = clean_text(_text(rc_el) if rc_el is not None else None)
+    lap("rating数量")
+
+    # ---------- 店铺名称 + 是否FBA ----------
+    seller = "—"
+    ships_from = "—"
+
+    # 新版 tabular buybox
+    if ids.get("tabular-buybox") is not None:
+        for block in _XP_BUYBOX_ROWS(ids["tabular-buybox"]):
+            label_el = _one(_XP_BUYBOX_LABEL, block)
+            text_el = _one(_XP_BUYBOX_TEXT, block)
+            if label_el is None or text_el is None:
+                continue
+            label = _text(label_el).lower()
+            value = clean_text(_text(text_el))
+            if "sold" in label and seller == "—":
+                seller = value
+            elif "ships" in label and ships_from == "—":
+                ships_from = value
+
+    # 旧式两行文本
+    if seller == "—" or ships_from == "—":
+        for box_id in ("shipsFromSoldBy_feature_div", "desktop_buybox", "rightCol", "buybox_feature_div"):
+            box = ids.get(box_id)
+            if box is None:
+                continue
+            if ships_from == "—":
+                ships_from = _labelled_value(box, SHIPS_FROM_LABEL_RE, "ships from") or ships_from
+            if seller == "—":
+                seller = _labelled_value(box, SOLD_BY_LABEL_RE, "sold by") or seller
+
+            # 块内兜底
+            if ships_from == "—":
+                m1 = SHIPS_FROM_INLINE_RE.search(idx.block_text(box_id))
+                if m1:
+                    ships_from = clean_text(m1.group(1))
+            if seller == "—":
+                m2 = SOLD_BY_INLINE_RE.search(idx.block_text(box_id))
+                if m2:
+                    seller = clean_text(m2.group(1))
+
+    # merchant-info 兜底
+    if seller == "—" and idx.block_text("merchant-info") is not None:
+        m = SOLD_BY_INLINE_RE.search(idx.block_text("merchant-info"))
+        if m:
+            seller = clean_text(m.group(1))
+
+    data["店铺名称"] = seller
+    lap("店铺名称")
+
+    # 是否FBA：区块文字已在索引里缓存，不再重复查找
+    blocks = [idx.block_text(i) for i in FBA_BLOCK_IDS if idx.block_text(i) is not None]
+    data["是否FBA"] = classify_fba(ships_from, seller, blocks, market["fba_rule"])
+    lap("是否FBA")
+
+    # ---------- 类目&排名 ----------
+    bsr = "—"
+    for node_id in ("detailBullets_feature_div", "productDetails_detailBullets_sections1", "prodDetails"):
+        text = idx.block_text(node_id)
+        if text is None:
+            continue
+        mm = BSR_RE.search(text)
+        if mm:
+            bsr = clean_text(mm.group(1))
+            break
+    if bsr == "—" and ids.get("wayfinding-breadcrumbs_feature_div") is not None:
+        crumbs = [_text(a) for a in _XP_LINKS(ids["wayfinding-breadcrumbs_feature_div"])]
+        if crumbs:
+            bsr = " / ".join([c for c in crumbs if c])
+    data["类目&排名"] = bsr
+    lap("类目&排名")
+
+    # ---------- review 情况 ----------
+    reviews = [el for el in idx.hooks.get("review", ()) if el.tag == "div"]
+    rv = next((r for r in (_one(_XP_REVIEW_TITLE, el) for el in reviews) if r is not None), None)
+    if rv is None:
+        rv = next((r for r in (_one(_XP_REVIEW_BODY, el) for el in reviews) if r is not None), None)
+    if rv is not None:
+        txt = _text(rv)
+        data["review情况"] = clean_text(txt[:120] + ("..." if len(txt) > 120 else ""))
+    else:
+        data["review情况"] = "—"
+    lap("review情况")
+
+    return data
+
+
+# ============ 解析耗时对比 ============
+PARSE_FIELDS = ["产品图片", "链接", "亚马逊ASIN", "价格", "类目&排名", "评分", "店铺名称", "是否FBA", "rating数量", "review情况"]
+
+
+def bench_parse(paths, site="us", rounds=5):
+    """
+    用本地保存的商品页 HTML 对比旧版 BeautifulSoup 解析与 lxml 单次遍历解析：
+    打印每页耗时（取 rounds 次最快）以及两者结果不一致的字段
+    """
+    total_old = total_new = 0.0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        timings = {}
+        outputs = {}
+        for name, fn in (("old", parse_product_bs4), ("new", parse_product)):
+            best = float("inf")
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                outputs[name] = fn(html, "", site)
+                best = min(best, time.perf_counter() - t0)
+            timings[name] = best
+        total_old += timings["old"]
+        total_new += timings["new"]
+        diff = [k for k in PARSE_FIELDS if outputs["old"].get(k) != outputs["new"].get(k)]
+        print(
+            f"{os.path.basename(path)}: BeautifulSoup {timings['old'] * 1000:.1f} ms -> "
+            f"lxml {timings['new'] * 1000:.1f} ms（{timings['old'] / timings['new']:.1f}x）"
+            + (f"  字段不一致：{', '.join(diff)}" if diff else "")
+        )
+    if paths:
+        n = len(paths)
+        print(f"[BENCH] 平均每页：{total_old / n * 1000:.1f} ms -> {total_new / n * 1000:.1f} ms")
+
+
+# ============ 收货地址（页面顶部 “Deliver to”） ============
+_XP_LOCATION = etree.XPath("//*[@id='glow-ingress-line2']")
+
+
+def parse_location(html):
+    """读取页面顶部显示的收货地址（如 "New York 10001"），读不到返回 None"""
+    el = _one(_XP_LOCATION, _document(html))
+    if el is None:
+        return None
+    label = clean_text(_text(el, " ").replace("\u200c", "").replace("\u200e", ""))
+    return None if label == "—" else label
+
+
+# ============ 搜索结果页 / 品牌店铺页 ============
+_XP_RESULT_CARDS = etree.XPath("//div[@data-component-type='s-search-result'][@data-asin]")
+_XP_CARD_PRICE = etree.XPath(
+    f"(.//span[{_has_class('a-price')}][not({_has_class('a-text-price')})]//span[{_has_class('a-offscreen')}])[1]"
+)
+_XP_CARD_RATING = etree.XPath(f"(.//*[{_has_class('a-icon-alt')}])[1]")
+_XP_CARD_REVIEWS = etree.XPath("(.//a[contains(@href, 'customerReviews')])[1]")
+_XP_CARD_IMG = etree.XPath(f"(.//img[{_has_class('s-image')}])[1]")
+_XP_CARD_SPONSORED = etree.XPath(
+    f"boolean(.//*[{_has_class('puis-sponsored-label-text')}] | .//*[normalize-space(text()) = 'Sponsored'])"
+)
+_XP_NEXT_PAGE = etree.XPath(f"(//a[{_has_class('s-pagination-next')}]/@href)[1]")
+_XP_HREFS = etree.XPath("//a/@href")
+_XP_DATA_ASINS = etree.XPath("//*[@data-asin]/@data-asin")
+
+
+def parse_search_page(html, base_url):
+    """
+    解析搜索结果页：返回 (卡片列表, 下一页链接或 None)。
+    每张卡片带 ASIN、价格、评分、rating 数量、主图和是否广告位，格式与商品页解析的同名字段一致
+    """
+    root = _document(html)
+    cards = []
+    for card in _XP_RESULT_CARDS(root):
+        asin = card.get("data-asin")
+        if not asin or not ASIN_RE.fullmatch(asin):
+            continue
+        price_el = _one(_XP_CARD_PRICE, card)
+        rating_el = _one(_XP_CARD_RATING, card)
+        reviews_el = _one(_XP_CARD_REVIEWS, card)
+        img_el = _one(_XP_CARD_IMG, card)
+        reviews = clean_text(_text(reviews_el) if reviews_el is not None else None).strip("()")
+        cards.append({
+            "亚马逊ASIN": asin,
+            "价格": clean_text(_text(price_el) if price_el is not None else None),
+            "评分": clean_text(_text(rating_el) if rating_el is not None else None),
+            "rating数量": reviews or "—",
+            "产品图片": (img_el.get("src") if img_el is not None else None) or "—",
+            "广告": "是" if _XP_CARD_SPONSORED(card) else "否",
+        })
+    next_href = _one(_XP_NEXT_PAGE, root)
+    return cards, urljoin(base_url, next_href) if next_href else None
+
+
+def parse_store_asins(html):
+    """品牌店铺页：按出现顺序返回商品链接和 data-asin 里的全部 ASIN（去重）"""
+    root = _document(html)
+    seen = {}
+    for href in _XP_HREFS(root):
+        asin = get_asin_from_url(href)
+        if asin:
+            seen.setdefault(asin, None)
+    for asin in _XP_DATA_ASINS(root):
+        if ASIN_RE.fullmatch(asin):
+            seen.setdefault(asin, None)
+    return list(seen)
+
+
+# ============ Best Sellers 榜单页 ============
+_XP_ZG_ITEMS = etree.XPath("//*[@id='gridItemRoot']")
+_XP_ZG_RANK = etree.XPath(f"(.//*[{_has_class('zg-bdg-text')}])[1]")
+_XP_ZG_ASIN = etree.XPath("(.//*[string-length(@data-asin) = 10]/@data-asin)[1]")
+_XP_ZG_PRICE = etree.XPath(
+    f"(.//span[contains(@class, 'p13n-sc-price')] | .//span[{_has_class('a-color-price')}])[1]"
+)
+_XP_ZG_REVIEWS = etree.XPath(
+    f"(.//a[contains(@href, '/product-reviews/')]//span[{_has_class('a-size-small')}])[1]"
+)
+_XP_ZG_TITLE = etree.XPath("(//h1)[1]")
+_XP_ZG_RECS = etree.XPath("//*[@data-client-recs-list]/@data-client-recs-list")
+_XP_ZG_NEXT = etree.XPath(f"(//ul[{_has_class('a-pagination')}]/li[{_has_class('a-last')}]/a/@href)[1]")
+_ZG_CATEGORY_RE = re.compile(r"^\s*(?:Amazon\s+)?Best\s*Sellers\s*(?:in|:)\s*", re.I)
+
+
+def parse_bestsellers(html, url, site="us"):
+    """
+    解析 Best Sellers 榜单页：返回 (类目名, 结果行列表, 下一页链接或 None)。
+    结果行与商品页解析的字段相同（类目&排名 为 "排名 in 类目"），榜单上没有的店铺名称 / FBA / review情况 为 "—"。
+    页面首屏只渲染前 30 名，其余名次的 ASIN 和排名从 data-client-recs-list 补上
+    """
+    root = _document(html)
+    title_el = _one(_XP_ZG_TITLE, root)
+    category = _ZG_CATEGORY_RE.sub("", _text(title_el, " ")) if title_el is not None else ""
+    category = clean_text(category)
+    domain = MARKETPLACES[site]["domain"]
+
+    def row(asin, rank, price=None, rating=None, reviews=None, img=None):
+        ranks[asin] = (rank or "").replace(",", "")
+        return {
+            "产品图片": img or "—",
+            "链接": f"https://www.{domain}/dp/{asin}",
+            "亚马逊ASIN": asin,
+            "价格": clean_text(price),
+            "类目&排名": f"{rank} in {category}" if rank else "—",
+            "评分": clean_text(rating),
+            "店铺名称": "—",
+            "是否FBA": "—",
+            "rating数量": clean_text(reviews),
+            "review情况": "—",
+        }
+
+    rows, seen, ranks = [], set(), {}
+    for item in _XP_ZG_ITEMS(root):
+        asin = _one(_XP_ZG_ASIN, item)
+        if not asin or not ASIN_RE.fullmatch(asin) or asin in seen:
+            continue
+        seen.add(asin)
+        rank_el = _one(_XP_ZG_RANK, item)
+        price_el = _one(_XP_ZG_PRICE, item)
+        rating_el = _one(_XP_CARD_RATING, item)
+        reviews_el = _one(_XP_ZG_REVIEWS, item)
+        img_el = _one(_XP_FIRST_IMG, item)
+        rows.append(row(
+            asin,
+            _text(rank_el).lstrip("#") if rank_el is not None else None,
+            _text(price_el) if price_el is not None else None,
+            _text(rating_el) if rating_el is not None else None,
+            _text(reviews_el) if reviews_el is not None else None,
+            img_el.get("src") if img_el is not None else None,
+        ))
+
+    for recs in _XP_ZG_RECS(root):
+        try:
+            items = json.loads(recs)
+        except ValueError:
+            continue
+        for rec in items:
+            asin = rec.get("id")
+            if asin and ASIN_RE.fullmatch(asin) and asin not in seen:
+                seen.add(asin)
+                rows.append(row(asin, (rec.get("metadataMap") or {}).get("render.zg.rank")))
+
+    # 按名次排序（补上的名次通常排在首屏之后，但不保证）
+    rows.sort(key=lambda r: int(ranks[r["亚马逊ASIN"]]) if ranks.get(r["亚马逊ASIN"], "").isdigit() else 10**9)
+    next_href = _one(_XP_ZG_NEXT, root)
+    return category, rows, urljoin(url, next_href) if next_href else None
+
+
+# ============ 全部报价（All Offers Display 片段） ============
+_XP_AOD_OFFERS = etree.XPath("//*[@id='aod-pinned-offer' or @id='aod-offer']")
+_XP_AOD_TOTAL = etree.XPath("(//*[@id='aod-total-offer-count']/@value)[1]")
+_XP_AOD_CONDITION = etree.XPath("(.//*[@id='aod-offer-heading']//h5 | .//*[@id='aod-offer-heading']//span)[1]")
+_XP_AOD_SHIPS_FROM = etree.XPath(
+    f"(.//*[@id='aod-offer-shipsFrom']//*[{_has_class('a-col-right')}]//span)[1]"
+)
+_XP_AOD_SOLD_BY = etree.XPath(
+    f"(.//*[@id='aod-offer-soldBy']//*[{_has_class('a-col-right')}]//*[self::a or self::span])[1]"
+)
+_XP_AOD_DELIVERY = etree.XPath("(.//*[@data-csa-c-delivery-price])[1]")
+_SELLER_ID_RE = re.compile(r"[?&]seller=([A-Z0-9]+)")
+OFFER_FIELDS = ["站点", "亚马逊ASIN", "链接", "位置", "是否购物车", "价格", "成色", "卖家", "卖家ID", "发货方", "是否FBA", "运费"]
+
+
+def parse_offers(html, site, asin, page_no=1):
+    """
+    解析全部报价片段（/gp/aod/ajax，商品页 “Other sellers on Amazon” 弹层的内容）：返回 (报价列表, 报价总数或 None)。
+    第一页包含购物车报价（位置 0）和最多 10 个其他报价，第 page_no 页的位置接着往后数；
+    每个报价单独按 Ships from / Sold by 判断是否 FBA，规则同商品页（站点 fba_rule）
+    """
+    root = _document(html)
+    market = MARKETPLACES[site]
+    total = _one(_XP_AOD_TOTAL, root)
+    offers = []
+    pos = (page_no - 1) * 10
+    for el in _XP_AOD_OFFERS(root):
+        pinned = el.get("id") == "aod-pinned-offer"
+        if pinned and page_no > 1:
+            continue  # 翻页时 Amazon 会再带上购物车报价
+        if not pinned:
+            pos += 1
+        price_el = _one(_XP_PRICE_IN, el)
+        condition_el = _one(_XP_AOD_CONDITION, el)
+        ships_el = _one(_XP_AOD_SHIPS_FROM, el)
+        seller_el = _one(_XP_AOD_SOLD_BY, el)
+        delivery_el = _one(_XP_AOD_DELIVERY, el)
+        ships_from = clean_text(_text(ships_el, " ") if ships_el is not None else None)
+        seller = clean_text(_text(seller_el, " ") if seller_el is not None else None)
+        seller_id = _SELLER_ID_RE.search(seller_el.get("href") or "") if seller_el is not None else None
+        offers.append({
+            "站点": site,
+            "亚马逊ASIN": asin,
+            "链接": f"https://www.{market['domain']}/dp/{asin}",
+            "位置": 0 if pinned else pos,
+            "是否购物车": "是" if pinned else "否",
+            "价格": clean_text(_text(price_el) if price_el is not None else None),
+            "成色": clean_text(_text(condition_el, " ") if condition_el is not None else None),
+            "卖家": normalize_seller_name(seller),
+            "卖家ID": seller_id.group(1) if seller_id else "—",
+            "发货方": ships_from,
+            "是否FBA": classify_fba(ships_from, seller, [], market["fba_rule"]),
+            "运费": clean_text(delivery_el.get("data-csa-c-delivery-price") if delivery_el is not None else None),
+        })
+    return offers, int(total) if total and total.isdigit() else None
+
+
+# ============ 评论页 ============
+_XP_REVIEWS = etree.XPath("//*[@data-hook='review'][@id]")
+_XP_RV_TITLE = etree.XPath("(.//*[@data-hook='review-title']/span[not(contains(@class, 'a-icon-alt'))])[last()]")
+_XP_RV_STARS = etree.XPath(
+    "(.//*[@data-hook='review-star-rating' or @data-hook='cmps-review-star-rating']"
+    f"//span[{_has_class('a-icon-alt')}])[1]"
+)
+_XP_RV_DATE = etree.XPath("(.//*[@data-hook='review-date'])[1]")
+_XP_RV_BODY = etree.XPath("(.//*[@data-hook='review-body'])[1]")
+_XP_RV_AUTHOR = etree.XPath(f"(.//span[{_has_class('a-profile-name')}])[1]")
+_XP_RV_VERIFIED = etree.XPath("boolean(.//*[@data-hook='avp-badge'])")
+_XP_RV_HELPFUL = etree.XPath("(.//*[@data-hook='helpful-vote-statement'])[1]")
+_XP_RV_FORMAT = etree.XPath("(.//*[@data-hook='format-strip'])[1]")
+_REVIEW_DATE_RE = re.compile(r"Reviewed in (.+?) on (.+)$")
+_STARS_RE = re.compile(r"([\d.]+) out of 5")
+_HELPFUL_RE = re.compile(r"([\d,]+|One) (?:person|people)", re.I)
+REVIEW_FIELDS = ["站点", "亚马逊ASIN", "评论ID", "日期", "评分", "标题", "内容", "作者", "已验证购买", "有用数", "款式", "评论地区"]
+
+
+def parse_review_date(text):
+    """ "March 3, 2024"（美国）/ "3 March 2024"（英国、澳洲）-> "2024-03-03"，解析不了返回 None"""
+    for fmt in ("%B %d, %Y", "%d %B %Y"):
+        try:
+            return datetime.strptime(text.strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def parse_review_page(html, site, asin):
+    """
+    解析一页评论（按时间倒序的 product-reviews 页）：返回 (评论列表, 是否还有下一页)。
+    每条评论的字段见 REVIEW_FIELDS；日期统一为 YYYY-MM-DD，便于按日期截止和增量比较
+    """
+    root = _document(html)
+    reviews = []
+    for el in _XP_REVIEWS(root):
+        date_el = _one(_XP_RV_DATE, el)
+        m = _REVIEW_DATE_RE.search(_text(date_el, " ")) if date_el is not None else None
+        stars_el = _one(_XP_RV_STARS, el)
+        stars = _STARS_RE.search(_text(stars_el)) if stars_el is not None else None
+        helpful_el = _one(_XP_RV_HELPFUL, el)
+        helpful = _HELPFUL_RE.search(_text(helpful_el, " ")) if helpful_el is not None else None
+        title_el, body_el = _one(_XP_RV_TITLE, el), _one(_XP_RV_BODY, el)
+        author_el, format_el = _one(_XP_RV_AUTHOR, el), _one(_XP_RV_FORMAT, el)
+        reviews.append({
+            "站点": site,
+            "亚马逊ASIN": asin,
+            "评论ID": el.get("id"),
+            "日期": parse_review_date(m.group(2)) if m else None,
+            "评分": float(stars.group(1)) if stars else None,
+            "标题": clean_text(_text(title_el, " ")) if title_el is not None else None,
+            "内容": _text(body_el, "\n") if body_el is not None else None,
+            "作者": _text(author_el) if author_el is not None else None,
+            "已验证购买": bool(_XP_RV_VERIFIED(el)),
+            "有用数": (1 if helpful.group(1).lower() == "one" else int(helpful.group(1).replace(",", ""))) if helpful else 0,
+            "款式": clean_text(_text(format_el, " ")) if format_el is not None else None,
+            "评论地区": m.group(1) if m else None,
+        })
+    has_next = _one(_XP_ZG_NEXT, root) is not None
+    return reviews, has_next
+
+
+# ============ 旧版解析（BeautifulSoup，保留作对照基准） ============
+def parse_product_bs4(html, url, site="us"):
+    """BeautifulSoup 逐个 select_one 的原始解析逻辑，bench_parse 用它来对比耗时和结果"""
+    market = MARKETPLACES[site]
+    currency = market["currency"]
+    soup = BeautifulSoup(html, "lxml")
+
+    data = {}
+
+    # ---------- 产品主图 ----------
+    img_url = None
+    img_el = soup.select_one("#landingImage") or soup.select_one("#imgTagWrapperId img")
+    if img_el and img_el.get("src"):
+        img_url = img_el.get("src")
+    if not img_url:
+        thumb = soup.select_one("#altImages img, .imageThumbnail img")
+        if thumb and thumb.get("src"):
+            img_url = thumb.get("src")
+    data["产品图片"] = img_url if img_url else "—"
+
+    # ---------- 商品链接 ----------
+    data["链接"] = url
+
+    # ---------- ASIN ----------
+    data["亚马逊ASIN"] = get_asin(url, soup)
+
+    # ---------- 价格 ----------
+    price = None
+    for sel in [
+        "#corePrice_feature_div .a-price .a-offscreen",
+        "#apex_desktop .a-price .a-offscreen",
+        "#corePrice_desktop_feature_div .a-price .a-offscreen",
+        "#price_inside_buybox",
+        "span.a-price .a-offscreen",
+    ]:
+        el = soup.select_one(sel)
+        if el and currency in el.get_text():
+            price = el.get_text(strip=True)
+            break
+    if not price:
+        for el in soup.select("span.a-offscreen"):
+            parent = el.find_parent()
+            pid = parent.get("id") if parent else ""
+            if pid and re.search(r"(installment|emi)", pid, re.I):
+                continue
+            txt = el.get_text(strip=True)
+            if currency in txt and PRICE_TEXT_RES[currency].search(txt) and len(txt) < 24:
+                price = txt
+                break
+    if not price:
+        whole = soup.select_one("span.a-price-whole")
+        frac = soup.select_one("span.a-price-fraction")
+        sym = soup.select_one("span.a-price-symbol")
+        if whole:
+            price = (sym.get_text(strip=True) if sym else currency) + whole.get_text(strip=True)
+            if frac:
+                price += "." + frac.get_text(strip=True)
+    data["价格"] = clean_text(price)
+
+    # ---------- 评分 ----------
+    rating_el = (
+        soup.select_one("span[data-hook='rating-out-of-text']")
+        or soup.select_one("i[data-hook='average-star-rating'] span")
+        or soup.select_one("span.a-icon-alt")
+    )
+    data["评分"] = clean_text(rating_el.get_text(strip=True) if rating_el else None)
+
+    # ---------- review 数量 ----------
+    rc_el = (
+        soup.select_one("#acrCustomerReviewText")
+        or soup.select_one("span#acrCustomerReviewText")
+        or soup.select_one("[data-hook='total-review-count']")
+        or soup.select_one("#acrPopover .a-size-base")
+    )
+    data["rating数量"] = clean_text(rc_el.get_text(strip=True) if rc_el else None)
+
+    # ---------- 店铺名称 + 是否FBA ----------
+    seller = "—"
+    ships_from = "—"
+
+    # 新版 tabular buybox
+    for block in soup.select("#tabular-buybox .tabular-buybox-container, #tabular-buybox .tabular-buybox-text-row"):
+        label_el = block.select_one(".tabular-buybox-label")
+        text_el  = block.select_one(".tabular-buybox-text")
+        if not label_el or not text_el:
+            continue
+        label = label_el.get_text(strip=True).lower()
+        value = clean_text(text_el.get_text(strip=True))
+        if "sold" in label and seller == "—":
+            seller = value
+        elif "ships" in label and ships_from == "—":
+            ships_from = value
+
+    # 旧式两行文本
+    if seller == "—" or ships_from == "—":
+        for box_sel in ["#shipsFromSoldBy_feature_div", "#desktop_buybox", "#rightCol", "#buybox_feature_div"]:
+            box = soup.select_one(box_sel)
+            if not box:
+                continue
+            # Ships from
+            if ships_from == "—":
+                lab = box.find(string=re.compile(r'^\s*Ships\s*from\s*$', re.I))
+                if lab:
+                    row = lab.find_parent() or box
+                    cand = row.find_next(lambda tag: tag.name in ["a", "span", "div"] and clean_text(tag.get_text()))
+                    if cand:
+                        val = clean_text(cand.get_text())
+                        if val.lower() != "ships from":
+                            ships_from = val
+            # Sold by
+            if seller == "—":
+                lab = box.find(string=re.compile(r'^\s*Sold\s*by\s*$', re.I))
+                if lab:
+                    row = lab.find_parent() or box
+                    cand = row.find_next(lambda tag: tag.name in ["a", "span", "div"] and clean_text(tag.get_text()))
+                    if cand:
+                        val = clean_text(cand.get_text())
+                        if val.lower() != "sold by":
+                            seller = val
+
+            # 块内兜底
+            if ships_from == "—":
+                m1 = re.search(r"Ships\s*from\s+([A-Za-z0-9 &\-]+)", box.get_text(" ", strip=True), re.I)
+                if m1:
+                    ships_from = clean_text(m1.group(1))
+            if seller == "—":
+                m2 = re.search(r"Sold\s*by\s+(.+?)(?:\s+and|\s+\.|$)", box.get_text(" ", strip=True), re.I)
+                if m2:
+                    seller = clean_text(m2.group(1))
+
+    # merchant-info 兜底
+    if seller == "—":
+        mi = soup.select_one("#merchant-info")
+        if mi:
+            m = re.search(r"Sold\s*by\s+(.+?)(?:\s+and|\s+\.|$)", mi.get_text(" ", strip=True), re.I)
+            if m:
+                seller = clean_text(m.group(1))
+
+    data["店铺名称"] = seller
+
+    # 是否FBA（规则按站点 fba_rule）
+    data["是否FBA"] = detect_fba(soup, ships_from, seller, market["fba_rule"])
+
+    # ---------- 类目&排名 ----------
+    bsr = "—"
+    for sel in ["#detailBullets_feature_div", "#productDetails_detailBullets_sections1", "#prodDetails"]:
+        node = soup.select_one(sel)
+        if not node:
+            continue
+        text = node.get_text(" ", strip=True)
+        mm = re.search(r"Best\s*Sellers?\s*Rank\s*:?\s*(.+?)(?:Date First Available|Customer Reviews|ASIN|$)", text, flags=re.I)
+        if mm:
+            bsr = clean_text(mm.group(1))
+            break
+    if bsr == "—":
+        crumbs = [a.get_text(strip=True) for a in soup.select("#wayfinding-breadcrumbs_feature_div a")]
+        if crumbs:
+            bsr = " / ".join([c for c in crumbs if c])
+    data["类目&排名"] = bsr
+
+    # ---------- review 情况 ----------
+    rv = (
+        soup.select_one("div[data-hook='review'] span[data-hook='review-title'] span")
+        or soup.select_one("div[data-hook='review'] span[data-hook='review-body'] span")
+    )
+    if rv:
+        txt = rv.get_text(strip=True)
+        data["review情况"] = clean_text(txt[:120] + ("..." if len(txt) > 120 else ""))
+    else:
+        data["review情况"] = "—"
+
+    return data
+
+
+# ============ 最终简化+去重版店铺名称清洗模块 ============
+def normalize_seller_name(name: str) -> str:
+    """
+    店铺名称清洗逻辑：
+    - 去除前后空格
+    - 如果包含 "Sold by"（不区分大小写），截断保留前部分
+    - 去掉重复子串（如 "Conglin AU Conglin AU" → "Conglin AU"）
+    """
+    if not name or name == "—":
+        return "—"
+
+    s = name.strip()
+    # 遇到 Sold by 就截断
+    m = re.search(r"(?i)\bSold\s*by\b", s)
+    if m:
+        s = s[:m.start()]
+
+    # 去除多余空格和标点
+    s = s.strip(" .-–")
+
+    # 判断重复（整串重复两遍的情况）
+    parts = s.split()
+    half = len(parts) // 2
+    if len(parts) % 2 == 0 and parts[:half] == parts[half:]:
+        s = " ".join(parts[:half])
+
+    return s if s else "—"
+
+
+def apply_seller_cleanup(rows):
+    """就地清洗 rows 里的“店铺名称”字段"""
+    for r in rows:
+        if "店铺名称" in r:
+            r["店铺名称"] = normalize_seller_name(r.get("店铺名称", "—"))
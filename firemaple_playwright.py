@@ -0,0 +1,1155 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_playwright.py
+多站点抓取引擎：按站点配置表（firemaple_sites.MARKETPLACES）驱动，
+一个浏览器、每个站点一个独立 context（各自的收货地址），US / UK / AU 并发抓取，
+每个站点照旧输出自己的 CSV 和带缩略图的 .xlsx。
+
+用法：
+    python firemaple_playwright.py                   # 抓取 urls.txt 中所有能识别站点的链接
+    python firemaple_playwright.py --sites us,uk     # 只抓指定站点
+    python firemaple_playwright.py --headless        # 无界面运行（复用 session/ 中保存的收货地址）
+    python firemaple_playwright.py --reset-address   # 重新手动设置收货地址
+    python firemaple_playwright.py --due --budget 500  # 只刷新到期的商品，最多 500 个
+    python firemaple_playwright.py --bestsellers https://www.amazon.com/gp/bestsellers/sporting-goods/3400371
+    python firemaple_playwright.py --offers          # 同时采集每个商品的全部报价（页面内 fetch，不打开商品页）
+    python firemaple_playwright.py --reviews --reviews-since 2026-01-01  # 增量采集评论到 reviews_<站点>.jsonl
+    python firemaple_playwright.py --sites us --brand Fire-Maple --search "fire maple stove"  # 搜索发现商品并抓取
+    python firemaple_playwright.py --no-http         # 所有商品页都用浏览器渲染（默认先 HTTP 直取，不全再用浏览器）
+    python firemaple_playwright.py --in-page 8       # 商品页在一个已设置地址的页面里用 fetch() 取 HTML，8 个并发
+    python firemaple_playwright.py --resume          # 中断后续跑上一次运行（已完成的商品跳过）
+    python firemaple_playwright.py --rebuild         # 不抓取，从上一次运行的日志重新导出 CSV / Excel
+    python firemaple_playwright.py --reparse         # 不抓取，用当前解析规则重新解析 html_archive/ 并导出
+    python firemaple_playwright.py --sites uk --bench-parse 页面1.html 页面2.html
+
+链接来源：urls.txt（按域名自动分到各站点）以及 urls_us.txt / urls_uk.txt / urls_au.txt。
+输出字段：
+产品图片 / 链接 / 亚马逊ASIN / 价格 / 类目&排名 / 评分 / 店铺名称 / 是否FBA / review数量 / review情况
+"""
+
+import argparse
+import asyncio
+import re
+import os
+import json
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from firemaple_sites import MARKETPLACES, home_url
+from firemaple_parse import parse_product, parse_location, apply_seller_cleanup, bench_parse
+from firemaple_export import ThumbCache, CsvSink, XlsxSink, make_thumbnail
+from firemaple_fetch import (
+    AdaptiveRateLimiter, BLOCK_HTML_RE, BLOCK_RETRIES, BLOCK_RETRY_DELAY, BlockedError, check_blocked,
+    IN_PAGE_CONCURRENCY, InPageFetcher, http_get,
+)
+from firemaple_journal import JOURNAL_DIR, REPARSE_PREFIX, RunJournal, item_key
+from firemaple_archive import iter_archive, reparse_file, save_page
+from firemaple_stats import StageStats, span
+from firemaple_urls import UrlSource
+from firemaple_state import StateStore, DueUrls
+from firemaple_stages import (
+    OffersStage, ReviewHarvester, discovery_sources, harvest_bestsellers, bestseller_urls, review_sink,
+    DISCOVER_MAX_PAGES, BESTSELLERS_MAX_PAGES, REVIEW_MAX_PER_ASIN,
+)
+
+# ============ 并发配置 ============
+WORKERS = 3          # 每个站点的并发页面数（共用该站点已设置好收货地址的 context）
+QUEUE_SIZE = 10      # 待抓取队列上限（有界队列，链接再多也不会一次性全部排进去）
+PARSE_WORKERS = os.cpu_count() or 1  # 解析进程数（HTML 交给进程池解析，不占用事件循环）；0 表示在事件循环里直接解析
+STATS_FILE = "stages.json"   # 各阶段耗时 p50/p95/p99 和分布，写在本次运行的 journal 目录里
+LIVE_STATS_INTERVAL = 30     # --live-stats 时打印耗时表的间隔（秒）
+ARCHIVE_HTML = True  # 把每个商品页的原始 HTML 压缩存档到 html_archive/，改了解析规则后可 --reparse 重新解析
+HTTP_TIER = True     # 先用 HTTP 直接请求商品页（带浏览器 context 的 cookies，不渲染），字段不全或遇到验证码再用浏览器打开
+
+# ============ 收货地址会话 ============
+SESSION_DIR = "session"  # 各站点保存的 storage state（含登录/地址 cookies，勿外传）和当时的收货地址
+
+# ============ 网络拦截配置（省流量） ============
+# 各站点默认方案见 MARKETPLACES[站点]["block_profile"]，--profile 可统一覆盖
+NETSTATS_PATH = "netstats_{site}.json"  # 记录各 profile 平均每页流量/耗时，用于计算节省量
+CAPTURE_MAIN_IMAGE = True               # 抓取时直接复用浏览器已加载的主图生成缩略图，导出时不再重复下载
+
+
+# ============ 网络拦截（Playwright route） ============
+NETWORK_PROFILES = {
+    # 完整加载（对照组）
+    "full": {"block_types": set(), "block_trackers": False},
+    # 只保留文档、脚本、样式和 XHR：价格/buybox 依赖的脚本照常执行；图片只需要 src（CAPTURE_MAIN_IMAGE 时放行主图）
+    "lean": {"block_types": {"image", "media", "font"}, "block_trackers": True},
+}
+
+# 商品主图（#landingImage 加载的 _AC_SX679_ / _AC_SY450_ 这类尺寸），CAPTURE_MAIN_IMAGE 时放行
+MAIN_IMAGE_RE = re.compile(r"/images/I/[^/?]+\._AC_S[XY]\d{3,4}_\.")
+
+# 广告 / 统计 / 埋点请求
+TRACKER_RE = re.compile(
+    r"^https?://(?:[^/]*\.)?(?:amazon-adsystem\.com|doubleclick\.net|googlesyndication\.com"
+    r"|google-analytics\.com|googletagmanager\.com|scorecardresearch\.com|facebook\.(?:net|com))/"
+    r"|^https?://(?:fls|unagi)(?:-[a-z]+)?\.amazon\.[a-z.]+/"
+    r"|/(?:rd/)?uedata",
+    re.I,
+)
+
+
+class NetStats:
+    """单个 page 的流量统计：当前商品页 + 整次运行累计"""
+
+    def __init__(self):
+        self.page_bytes = 0
+        self.page_blocked = 0
+        self.pages = 0
+        self.total_bytes = 0
+        self.total_blocked = 0
+        self.total_seconds = 0.0
+        self._t0 = 0.0
+
+    def start_page(self):
+        self.page_bytes = 0
+        self.page_blocked = 0
+        self._t0 = time.perf_counter()
+
+    def end_page(self):
+        self.pages += 1
+        self.total_bytes += self.page_bytes
+        self.total_blocked += self.page_blocked
+        self.total_seconds += time.perf_counter() - self._t0
+
+
+async def apply_network_profile(page, profile, allow_main_image=CAPTURE_MAIN_IMAGE):
+    """给 page 挂上请求拦截和流量统计，返回该 page 的 NetStats"""
+    rules = NETWORK_PROFILES[profile]
+    stats = NetStats()
+
+    async def on_route(route):
+        req = route.request
+        if allow_main_image and req.resource_type == "image" and MAIN_IMAGE_RE.search(req.url):
+            await route.continue_()
+        elif req.resource_type in rules["block_types"] or (rules["block_trackers"] and TRACKER_RE.search(req.url)):
+            stats.page_blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def on_request_finished(request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        stats.page_bytes += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+
+    if rules["block_types"] or rules["block_trackers"]:
+        await page.route("**/*", on_route)
+    page.on("requestfinished", on_request_finished)
+    return stats
+
+
+def report_network_stats(stats_list, site, profile):
+    """打印平均每页流量/耗时；和该站点 full 模式的历史均值对比得出每页节省量"""
+    path = NETSTATS_PATH.format(site=site)
+    name = MARKETPLACES[site]["name"]
+    pages = sum(s.pages for s in stats_list)
+    if not pages:
+        return
+    avg_kb = sum(s.total_bytes for s in stats_list) / pages / 1024
+    avg_sec = sum(s.total_seconds for s in stats_list) / pages
+    avg_blocked = sum(s.total_blocked for s in stats_list) / pages
+    print(f"[NET] {name} profile={profile}：平均每页 {avg_kb:.0f} KB / {avg_sec:.1f} s，拦截 {avg_blocked:.0f} 个请求")
+
+    history = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            history = {}
+    history[profile] = {"kb_per_page": round(avg_kb, 1), "sec_per_page": round(avg_sec, 2), "pages": pages}
+
+    base = history.get("full")
+    if profile != "full":
+        if base:
+            print(f"[NET] {name} 对比 full：每页节省 {base['kb_per_page'] - avg_kb:.0f} KB、{base['sec_per_page'] - avg_sec:.1f} s")
+        else:
+            print(f"[NET] {name} 暂无 full 模式基准；加 --profile full 跑一次即可算出节省量")
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+
+
+# ============ 复用浏览器已下载的主图 ============
+class MainImageCapture:
+    """
+    监听 page 上的主图响应；商品解析完成后，直接用浏览器拿到的图片字节生成缩略图写入缓存，
+    导出 Excel 时缓存命中，不必再用 requests 下载一遍
+    """
+
+    def __init__(self, page, cache):
+        self.cache = cache
+        self._responses = {}
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if response.request.resource_type == "image" and MAIN_IMAGE_RE.search(response.url):
+            self._responses[response.url] = response
+
+    def reset(self):
+        self._responses.clear()
+
+    async def store(self, img_url):
+        resp = self._responses.get(img_url)
+        self._responses.clear()
+        if resp is None or not resp.ok or img_url in self.cache:
+            return
+        try:
+            body = await resp.body()
+            thumb = await asyncio.to_thread(make_thumbnail, body)
+        except Exception:
+            return
+        self.cache.put(img_url, thumb)
+        self.cache.captured += 1
+
+
+async def fetch_main_image(request, img_url, cache):
+    """
+    HTTP / 页面内直取的商品页没有渲染，拿不到浏览器里的主图响应：用同一个 context.request 下载主图生成缩略图写入缓存，
+    导出 Excel 时同样直接命中。失败时不写，导出时再用 requests 下载
+    """
+    if not img_url or img_url == "—" or img_url in cache:
+        return
+    try:
+        resp = await request.get(img_url, timeout=15000)
+        if not resp.ok:
+            return
+        thumb = await asyncio.to_thread(make_thumbnail, await resp.body())
+    except Exception:
+        return
+    cache.put(img_url, thumb)
+    cache.captured += 1
+
+
+# ============ 页面就绪判定 ============
+# 字段 -> (就绪选择器, 最长等待毫秒, 是否懒加载)
+# 选择器出现即视为就绪；超时视为“已稳定”（页面本来就没有该字段，如缺货无价格）
+READY_FIELDS = {
+    "价格": (
+        "#corePrice_feature_div .a-offscreen, #corePrice_desktop_feature_div .a-offscreen, "
+        "#apex_desktop .a-offscreen, #price_inside_buybox, #outOfStock",
+        4000,
+        False,
+    ),
+    "buybox": ("#tabular-buybox, #merchant-info, #shipsFromSoldBy_feature_div", 4000, False),
+    "详情": ("#detailBullets_feature_div, #productDetails_detailBullets_sections1, #prodDetails", 3000, True),
+}
+
+
+async def wait_field(page, selector, timeout, lazy=False):
+    """等待单个字段出现；懒加载字段只有在当前不存在时才滚动页面去触发"""
+    if await page.query_selector(selector):
+        return True
+    if lazy:
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight / 2)")
+    try:
+        await page.wait_for_selector(selector, state="attached", timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+async def wait_until_ready(page):
+    """各字段并行等待，全部就绪（或各自到期）立即返回，不再固定 sleep"""
+    await asyncio.gather(*(wait_field(page, sel, ms, lazy) for sel, ms, lazy in READY_FIELDS.values()))
+
+
+# ============ 抓取单个商品 ============
+
+
+def http_page_complete(html, row):
+    """HTTP 直取的结果能否直接采用：有商品标题，且价格和卖家都解析到了（缺货页本来就没有，也算完整）"""
+    if 'id="productTitle"' not in html:
+        return False
+    if row["价格"] != "—" and row["店铺名称"] != "—":
+        return True
+    return 'id="outOfStock"' in html
+
+
+def parse_page(html, url, site, archive=False, http=False):
+    """
+    在解析进程（或当前进程）中执行：解析（可选存档），同时带回各字段耗时。
+    http 为 True（HTTP 直取的 HTML）时先检查字段是否齐全，不全返回的结果行为 None、也不存档，交给浏览器重抓
+    """
+    timings = {}
+    row = parse_product(html, url, site, timings)
+    if http and not http_page_complete(html, row):
+        return None, timings
+    if archive:
+        t0 = time.perf_counter()
+        save_page(site, url, html, row)
+        timings["存档"] = time.perf_counter() - t0
+    return row, timings
+
+
+async def run_parse(parse_pool, html, url, site, archive=False, http=False):
+    """parse_pool 为 None 时在当前进程解析，否则交给进程池（解析期间其它页面的导航照常进行）"""
+    if parse_pool is None:
+        return parse_page(html, url, site, archive, http)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parse_pool, parse_page, html, url, site, archive, http)
+
+
+async def fetch_product_direct(get, url, site, parse_pool=None, archive=False, stats=None, stage="HTTP请求"):
+    """
+    直取商品页 HTML（get 为 http_get 或 InPageFetcher.get），不渲染、不执行脚本，解析规则和浏览器相同。
+    返回 (结果行, 回退原因)；遇到验证码 / 限流、字段不全或请求失败时结果行为 None，由浏览器重新打开
+    """
+    try:
+        with span(stats, stage):
+            status, html = await get(url)
+    except Exception:
+        return None, "请求失败"
+    if status in (429, 503) or BLOCK_HTML_RE.search(html):
+        return None, "验证码"
+    if not 200 <= status < 300:
+        return None, f"HTTP {status}"
+    with span(stats, "解析"):
+        row, timings = await run_parse(parse_pool, html, url, site, archive, http=True)
+    if stats is not None:
+        for name, seconds in timings.items():
+            stats.add(f"解析:{name}", seconds)
+    return row, (None if row else "字段不全")
+
+
+async def fetch_product(page, url, site, parse_pool=None, archive=False, stats=None):
+    """
+    打开商品页并按站点规则解析字段（含主图 URL；店名/FBA逻辑）
+    传入 parse_pool 时 HTML 交给进程池解析，解析期间其它页面的导航照常进行
+    archive 为 True 时解析完顺手把原始 HTML 压缩存档（同样在解析进程里做）
+    传入 stats 时记录各阶段耗时（打开页面 / 等待 / 取 HTML / 解析及各字段）
+    遇到验证码 / 狗狗页 / 503 时抛出 BlockedError，由 crawl_worker 重新排队
+    """
+    try:
+        with span(stats, "打开页面"):
+            resp = await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+        with span(stats, "风控检查"):
+            await check_blocked(page, resp)
+        if resp is not None and resp.status == 404:
+            print(f"[ERROR] {url} 商品页不存在（404）")
+            return None
+        with span(stats, "等待标题"):
+            await page.wait_for_selector("#productTitle", timeout=30000)
+        with span(stats, "等待字段"):
+            await wait_until_ready(page)
+        with span(stats, "取HTML"):
+            html = await page.content()
+        with span(stats, "解析"):
+            row, timings = await run_parse(parse_pool, html, url, site, archive)
+        if stats is not None:
+            for name, seconds in timings.items():
+                stats.add(f"解析:{name}", seconds)
+        return row
+
+    except BlockedError:
+        raise
+    except Exception as e:
+        print(f"[ERROR] {url} 抓取失败：{e}")
+        return None
+
+
+# ============ 页面池并发抓取 ============
+class OrderedWriter:
+    """
+    结果按完成顺序到达、按链接顺序（序号 0, 1, 2 …）写出：乱序到达的先暂存，前面的都到齐后立即写入各 sink。
+    暂存量最多约等于在途页面数，内存不随总行数增长；店铺名称在写出时清洗
+    """
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self._pos = 0
+        self._ready = {}
+
+    def put(self, idx, row):
+        """row 为 None 表示该位置抓取失败，跳过"""
+        self._ready[idx] = row
+        while self._pos in self._ready:
+            row = self._ready.pop(self._pos)
+            self._pos += 1
+            if row:
+                apply_seller_cleanup([row])
+                for sink in self.sinks:
+                    sink.write(row)
+
+
+class SitePages:
+    """
+    一个站点的 context 和 worker 们在上面开的 page。
+    遇到风控时 rotate() 换一个新的 context（沿用 session/ 中保存的收货地址会话），
+    各 worker 取下一个链接时发现自己的 page 属于旧 context，就在新 context 上换一个 page；
+    旧 context 上的 page 全部换走后才关闭它，正在加载的页面不会被中途打断。
+    http 为 True 时商品页先用当前 context 的 request 直取（见 fetch_product_direct）；
+    in_page（InPageFetcher）不为 None 时改用页面内 fetch 直取。tiers 统计各方式完成的页数
+    """
+
+    def __init__(self, context, site, profile, thumb_cache=None, http=HTTP_TIER):
+        self.context = context
+        self.site = site
+        self.profile = profile
+        self.thumb_cache = thumb_cache
+        self.http = http
+        self.in_page = None
+        self.tiers = Counter()
+        self.generation = 0
+        self.rotations = 0
+        self.netstats = []
+        self._contexts = {0: context}
+        self._users = {0: 0}
+        self._lock = asyncio.Lock()
+
+    async def attach(self, page=None):
+        """在当前 context 上准备一个 page（网络拦截 + 主图复用），返回 (page, 代数, NetStats, MainImageCapture)"""
+        gen, context = self.generation, self.context
+        self._users[gen] += 1
+        page = page or await context.new_page()
+        netstats = await apply_network_profile(page, self.profile)
+        self.netstats.append(netstats)
+        capture = None
+        if CAPTURE_MAIN_IMAGE and self.thumb_cache is not None:
+            capture = MainImageCapture(page, self.thumb_cache)
+        return page, gen, netstats, capture
+
+    async def detach(self, slot):
+        """关闭 page；它所在的旧 context 已没有 page 在用时一并关闭"""
+        page, gen = slot[0], slot[1]
+        self._users[gen] -= 1
+        try:
+            await page.close()
+        except Exception:
+            pass
+        await self._close_unused(gen)
+
+    @asynccontextmanager
+    async def borrow(self):
+        """
+        不开 page、直接用当前 context 发请求（context.request）时借用它：返回 (context, 代数)。
+        借用期间和 attach 的 page 一样计入使用数，换下来的旧 context 等最后一个请求结束才关闭
+        """
+        gen, context = self.generation, self.context
+        self._users[gen] += 1
+        try:
+            yield context, gen
+        finally:
+            self._users[gen] -= 1
+            await self._close_unused(gen)
+
+    async def _close_unused(self, gen):
+        """第 gen 代 context 已被换下且没有 page / 请求在用时关闭"""
+        if gen == self.generation or self._users[gen] or gen not in self._contexts:
+            return
+        try:
+            await self._contexts.pop(gen).close()
+        except Exception:
+            pass
+
+    async def refresh(self, slot):
+        """slot 的 context 已被换掉时，换成新 context 上的 page"""
+        if slot[1] == self.generation:
+            return slot
+        fresh = await self.attach()
+        await self.detach(slot)
+        return fresh
+
+    async def rotate(self, gen):
+        """
+        第 gen 代 context 遇到风控：换一个新的 context；多个 page / 请求同时遇到时只换一次。
+        真的换了返回 True（调用方据此只降速一次）；旧 context 已没人在用时立即关闭
+        """
+        async with self._lock:
+            if gen != self.generation:
+                return False
+            state = session_path(self.site)
+            if not os.path.exists(state):
+                state = await self.context.storage_state()
+            self.context = await new_site_context(self.context.browser, self.site, state)
+            self.generation += 1
+            self.rotations += 1
+            self._contexts[self.generation] = self.context
+            self._users[self.generation] = 0
+        await self._close_unused(gen)
+        return True
+
+    def report_tiers(self):
+        """各方式完成的页数占比，以及直取回退到浏览器的原因"""
+        names = {"HTTP": "HTTP 直取", "页面内": "页面内 fetch", "浏览器": "浏览器"}
+        done = sum(self.tiers[k] for k in names)
+        if not (self.http or self.in_page) or not done:
+            return
+        parts = "，".join(f"{name} {self.tiers[k]} 页（{self.tiers[k] / done:.0%}）" for k, name in names.items() if self.tiers[k])
+        fallback = "，".join(f"{k[3:]} {n}" for k, n in self.tiers.most_common() if k.startswith("回退:"))
+        print(f"[TIER] {MARKETPLACES[self.site]['name']}：{parts}" + (f"；回退原因：{fallback}" if fallback else ""))
+
+
+async def requeue_later(queue, item, delay):
+    """delay 秒后把链接放回队列；放回之后原条目才算完成，保证 queue.join() 不会在重试之前返回"""
+    await asyncio.sleep(delay)
+    await queue.put(item)
+    queue.task_done()
+
+
+async def crawl_worker(
+    pool, slot, site, queue, limiter, pbar, retrying, journal=None, writer=None, parse_pool=None,
+    archive=False, stats=None, state=None,
+):
+    """
+    不断从队列取 (序号, 链接, 已重试次数) 抓取；结果立即写入抓取日志，再按链接顺序交给 writer 输出。
+    pool.in_page 不为 None 时先页面内 fetch 直取，否则 pool.http 为 True 时先 HTTP 直取，拿不到完整结果再用浏览器打开；
+    slot 为 None 的 worker（页面内 fetch 的额外并发）第一次需要浏览器时才开 page。
+    遇到风控：站点降速、更换 context，链接过一段时间（每次翻倍）重新排队，超过 BLOCK_RETRIES 次才放弃。
+    返回 worker 最后使用的 slot（可能为 None），由 crawl_with_pool 统一关闭
+    """
+    while True:
+        item = await queue.get()
+        if item is None:
+            queue.task_done()
+            return slot
+        idx, url, tries = item
+        if slot:
+            slot = await pool.refresh(slot)
+        gen = pool.generation
+        row = None
+        requeued = False
+        t0 = time.perf_counter()
+        try:
+            if pool.in_page or pool.http:
+                tier, stage = ("页面内", "页面内请求") if pool.in_page else ("HTTP", "HTTP请求")
+                with span(stats, "限速等待"):
+                    await limiter.acquire()
+                async with pool.borrow() as (context, _):
+                    get = pool.in_page.get if pool.in_page else http_get(context.request, site)
+                    row, reason = await fetch_product_direct(get, url, site, parse_pool, archive, stats, stage)
+                    if row and row["产品图片"] != "—" and CAPTURE_MAIN_IMAGE and pool.thumb_cache is not None:
+                        with span(stats, "主图缩略图"):
+                            await fetch_main_image(context.request, row["产品图片"], pool.thumb_cache)
+                if row:
+                    pool.tiers[tier] += 1
+                else:
+                    pool.tiers["回退:" + reason] += 1
+                    if reason == "验证码":
+                        limiter.backoff_once()
+            try:
+                if not row:
+                    slot = await pool.refresh(slot) if slot else await pool.attach()  # 直取期间 context 可能已被换掉
+                    page, gen, netstats, capture = slot
+                    with span(stats, "限速等待"):
+                        await limiter.acquire()
+                    netstats.start_page()
+                    if capture:
+                        capture.reset()
+                    row = await fetch_product(page, url, site, parse_pool, archive, stats)
+                    if row:
+                        pool.tiers["浏览器"] += 1
+                        netstats.end_page()
+                        if capture:
+                            with span(stats, "主图缩略图"):
+                                await capture.store(row["产品图片"])
+            except BlockedError as e:
+                # 同一代 context 上同时被拦的 worker 只换一次 context、只降速一次
+                with span(stats, "更换context"):
+                    if await pool.rotate(gen):
+                        limiter.backoff()
+                if tries < BLOCK_RETRIES:
+                    delay = BLOCK_RETRY_DELAY * 2 ** tries
+                    task = asyncio.create_task(requeue_later(queue, (idx, url, tries + 1), delay))
+                    retrying.add(task)
+                    task.add_done_callback(retrying.discard)
+                    requeued = True
+                    print(
+                        f"\n[WARN] {url} 遇到风控（{e}），{delay} 秒后重试；"
+                        f"{site.upper()} 降速到 {limiter.rate * 60:.0f} 次/分并更换 context"
+                    )
+                else:
+                    print(f"\n[ERROR] {url} 连续 {tries + 1} 次遇到风控，放弃（之后可用 --resume 重试）")
+            if row:
+                limiter.success()
+                if journal:
+                    with span(stats, "写日志"):
+                        journal.append(site, idx, url, row)
+                if state:
+                    with span(stats, "更新状态"):
+                        state.observe(site, url, row)
+        finally:
+            if stats is not None:
+                stats.add("整页", time.perf_counter() - t0)
+            pbar.set_postfix_str(limiter.postfix(), refresh=False)
+            if not requeued:
+                if writer:
+                    with span(stats, "写出CSV/Excel"):
+                        writer.put(idx, row)
+                pbar.update(1)
+                queue.task_done()
+
+
+async def iter_urls(urls):
+    """同时支持普通可迭代对象（UrlSource 等）和异步迭代器（Discovery）"""
+    if hasattr(urls, "__aiter__"):
+        async for url in urls:
+            yield url
+    else:
+        for url in urls:
+            yield url
+
+
+async def crawl_with_pool(
+    context, first_page, urls, site, workers=WORKERS, thumb_cache=None, profile=None, position=0,
+    journal=None, sinks=(), parse_pool=None, archive=False, stats=None, http=HTTP_TIER, state=None, offers=None,
+    in_page=0,
+):
+    """
+    单个站点的页面池并发抓取：
+    - workers 个 page 共用该站点的 context（收货地址 cookie 共享）
+    - urls 可以是任意可迭代对象（通常是 UrlSource，已规范化、去重），边读边通过有界队列分发；
+      也可以是异步迭代器（Discovery：边翻搜索页边产出链接，有 bind 方法时先绑定本站点的 context、限速器等）
+    - 每个 page 按 profile（默认取站点配置）拦截无用请求，结束时汇报流量/耗时
+    - 传入 thumb_cache 且 CAPTURE_MAIN_IMAGE 时，主图缩略图在抓取时直接写入缓存（浏览器复用已加载的主图，直取时用 context.request 下载）
+    - position 为 tqdm 进度条所在行，多个站点同时抓取时各占一行
+    - 传入 journal 时每条结果立即落盘，日志里已完成的链接不再抓取（续跑）
+    - 结果按链接顺序边抓边写入 sinks（CsvSink / XlsxSink），续跑时已完成的结果从日志补上
+    - 传入 parse_pool 时页面解析在进程池中进行，archive 为 True 时同时存档原始 HTML（见 fetch_product）
+    - 传入 stats（StageStats）时记录各阶段耗时
+    - 同一站点的所有 page 共用一个 AdaptiveRateLimiter，遇到限流自动降速
+    - 遇到验证码 / 狗狗页时换一个新的 context（见 SitePages），链接稍后重新排队
+    - http 为 True 时先 HTTP 直取（不渲染），字段不全或遇到验证码才用浏览器打开，结束时汇报各方式的占比
+    - 传入 state（StateStore）时每个结果都更新该 ASIN 的状态和刷新间隔
+    - offers 为 OffersStage（或同样以 (pool, limiter, stats) 建立的 sink 类）时同时采集每个商品的全部报价，
+      和商品页抓取共用 context 与限速器
+    - in_page > 0 时商品页先在一个停在首页的 page 里用 fetch() 直取（见 InPageFetcher），最多 in_page 个同时进行；
+      worker 数相应增加，多出来的 worker 只有需要回退到浏览器时才开 page
+    """
+    profile = profile or MARKETPLACES[site]["block_profile"]
+    done_rows = None  # 续跑时日志里已完成的结果，用到时才读取
+
+    pool = SitePages(context, site, profile, thumb_cache, http)
+    if in_page:
+        pool.in_page = InPageFetcher(pool, in_page)
+    slots = [await pool.attach(first_page)]
+    for _ in range(workers - 1):
+        slots.append(await pool.attach())
+    slots += [None] * (in_page - len(slots))
+
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    limiter = AdaptiveRateLimiter()
+    retrying = set()
+    if hasattr(urls, "bind"):
+        urls.bind(pool, limiter, stats, parse_pool)
+    offers_stage = offers(pool, limiter, stats) if offers else None
+    writer = OrderedWriter(list(sinks) + [offers_stage] if offers_stage else sinks)
+    if offers_stage:
+        offers_stage.start()
+
+    desc = f"{MARKETPLACES[site]['name']} 抓取进度"
+    with tqdm(desc=desc, unit="item", position=position) as pbar:
+        tasks = [
+            asyncio.create_task(
+                crawl_worker(
+                    pool, slot, site, queue, limiter, pbar, retrying, journal, writer, parse_pool, archive, stats,
+                    state,
+                )
+            )
+            for slot in slots
+        ]
+
+        async def produce():
+            nonlocal done_rows
+            idx = -1
+            async for url in iter_urls(urls):
+                idx += 1
+                if journal and journal.done(site, url):
+                    if done_rows is None:
+                        done_rows = journal.rows_by_key(site)
+                    writer.put(idx, done_rows.get(item_key(url)))
+                    continue
+                await queue.put((idx, url, 0))
+            await queue.join()  # 等重新排队的链接也抓完，再让 worker 退出
+            for _ in tasks:
+                await queue.put(None)
+
+        # 生产者和 worker 一起等：任何一方出现未处理的异常就取消其余任务并抛出，
+        # 不会因为 worker 全部退出、有界队列再也取不空而卡住
+        producer = asyncio.create_task(produce())
+        done, _ = await asyncio.wait([producer, *tasks], return_when=asyncio.FIRST_EXCEPTION)
+        errors = [t.exception() for t in done if not t.cancelled() and t.exception()]
+        if errors:
+            for task in [producer, *tasks, *retrying]:
+                task.cancel()
+            raise errors[0]
+        slots = [task.result() for task in tasks]
+        if offers_stage:
+            await offers_stage.finish()
+        if pool.in_page:
+            await pool.in_page.close()
+
+    if hasattr(urls, "report"):
+        urls.report()
+    pool.report_tiers()
+    report_network_stats(pool.netstats, site, profile)
+    print(
+        f"[RATE] {MARKETPLACES[site]['name']}：结束时速率 {limiter.rate * 60:.0f} 次/分，"
+        f"遇到限流 {limiter.backoffs} 次，更换 context {pool.rotations} 次"
+    )
+    for slot in slots:
+        if slot:
+            await pool.detach(slot)
+
+
+# ============ 事件循环占用统计 ============
+class LoopMonitor:
+    """
+    每隔 interval 秒醒来一次：实际醒来比预定晚多少，事件循环就被同步代码（解析、写文件等）占用了多久。
+    占用越高，各页面的导航 / 等待就越容易被拖慢
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.busy = 0.0
+        self.worst = 0.0
+        self._t0 = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - t - self.interval
+            if lag > 0:
+                self.busy += lag
+                self.worst = max(self.worst, lag)
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+        elapsed = time.perf_counter() - self._t0
+        if elapsed > 0:
+            print(
+                f"[LOOP] 事件循环占用 {self.busy:.1f} s / {elapsed:.0f} s（{self.busy / elapsed:.1%}），"
+                f"最长一次阻塞 {self.worst * 1000:.0f} ms"
+            )
+
+
+async def print_stats_live(stats, interval):
+    """--live-stats：抓取过程中定时打印各阶段耗时表（用 tqdm.write，不打乱进度条）"""
+    while True:
+        await asyncio.sleep(interval)
+        if stats.samples:
+            tqdm.write(stats.table())
+
+
+# ============ 站点准备 ============
+async def set_delivery_address(page, site):
+    """打开站点首页，提示手动修改收货地址（所有站点都打开后在 main 里统一按 Enter）"""
+    m = MARKETPLACES[site]
+    print(f"🔹 正在打开 Amazon {m['name']} 首页，请手动将收货地址修改为{m['address_hint']}...")
+    await page.goto(home_url(site), timeout=60000, wait_until="domcontentloaded")
+    await page.wait_for_timeout(2000)
+
+
+# ============ 收货地址会话（免手动设置） ============
+# 手动改好地址后保存 storage state（cookies + localStorage），下次运行直接载入；
+# 启动时只用 context 自带的 HTTP 请求取一次首页 HTML 核对地址，失效了才重新提示手动设置
+def session_path(site):
+    return os.path.join(SESSION_DIR, f"{site}.json")
+
+
+def load_saved_locations():
+    path = os.path.join(SESSION_DIR, "locations.json")
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+async def save_session(context, page, site):
+    """保存该站点的 storage state，并记下当前显示的收货地址作为之后核对的依据"""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    await page.reload(timeout=60000, wait_until="domcontentloaded")
+    label = parse_location(await page.content())
+    await context.storage_state(path=session_path(site))
+
+    locations = load_saved_locations()
+    locations[site] = label
+    with open(os.path.join(SESSION_DIR, "locations.json"), "w", encoding="utf-8") as f:
+        json.dump(locations, f, ensure_ascii=False, indent=2)
+    print(f"[SESSION] {MARKETPLACES[site]['name']} 已保存收货地址会话：{label or '（未读到地址）'}")
+
+
+async def check_location(context, site):
+    """不渲染页面，直接请求首页读取收货地址；和保存时一致返回 True"""
+    saved = load_saved_locations().get(site)
+    if not saved:
+        return False
+    try:
+        resp = await context.request.get(home_url(site), timeout=30000)
+        current = parse_location(await resp.text())
+    except Exception as e:
+        print(f"[SESSION] {MARKETPLACES[site]['name']} 核对收货地址失败：{e}")
+        return False
+    if current != saved:
+        print(f"[SESSION] {MARKETPLACES[site]['name']} 收货地址已失效（当前：{current or '未知'}，保存时：{saved}）")
+        return False
+    return True
+
+
+async def new_site_context(browser, site, storage_state=None):
+    """按站点语言新建 context；storage_state 为保存的会话文件（或 dict）时沿用其中的收货地址 cookies"""
+    return await browser.new_context(
+        locale=MARKETPLACES[site]["locale"],
+        viewport={"width": 1280, "height": 900},
+        storage_state=storage_state,
+    )
+
+
+async def open_site(browser, site, reuse_session=True):
+    """
+    每个站点一个独立 context（语言、收货地址互不影响），返回 (context, 首个 page, 是否需要手动设置地址)
+    有保存的会话且地址核对通过时直接复用，否则打开首页等待手动设置
+    """
+    state = session_path(site)
+    context = await new_site_context(browser, site, state if reuse_session and os.path.exists(state) else None)
+    page = await context.new_page()
+    if reuse_session and os.path.exists(state) and await check_location(context, site):
+        print(f"[SESSION] {MARKETPLACES[site]['name']} 复用已保存的收货地址：{load_saved_locations()[site]}")
+        return context, page, False
+    await set_delivery_address(page, site)
+    return context, page, True
+
+
+async def open_sites(browser, sites, reset_address=False, headless=False):
+    """
+    各站点同时准备：有效的已保存会话直接复用，其余打开首页统一手动设置收货地址。
+    返回 {站点: (context, page)}；无界面模式下需要手动设置的站点跳过
+    """
+    sites = list(sites)
+    opened = await asyncio.gather(*(open_site(browser, site, reuse_session=not reset_address) for site in sites))
+    manual = [site for site, (_, _, need) in zip(sites, opened) if need]
+    if manual and headless:
+        for site in manual:
+            print(f"[ERROR] {MARKETPLACES[site]['name']} 需要手动设置收货地址，无界面模式下跳过；请去掉 --headless 运行一次")
+    elif manual:
+        print("   各站点窗口修改完成后返回终端按 Enter 继续。")
+        input("👉 请手动修改地址完成后按 Enter 键继续抓取...")
+        for site, (context, page, need) in zip(sites, opened):
+            if need:
+                await save_session(context, page, site)
+        manual = []
+    return {site: (context, page) for site, (context, page, _) in zip(sites, opened) if site not in manual}
+
+
+def read_urls(sites):
+    """
+    各站点的链接来源（见 firemaple_urls.UrlSource：流式读取、规范化为 站点 + ASIN、去重，保持文件中的顺序）：
+    - urls.txt：按域名自动判断站点
+    - urls_<站点>.txt：该站点专用，域名识别不了的行、单独一行的 ASIN 都算作该站点
+    没有链接的站点不返回
+    """
+    paths = [("urls.txt", None)] + [(f"urls_{site}.txt", site) for site in sites]
+    sources = {site: UrlSource(site, paths, warn_unknown=(i == 0)) for i, site in enumerate(sites)}
+    return {site: src for site, src in sources.items() if src.any()}
+
+
+def site_sinks(site, thumb_cache=None):
+    """单个站点的输出：CSV + 带图片的 Excel，均为流式写入"""
+    m = MARKETPLACES[site]
+    return [CsvSink(m["csv_path"]), XlsxSink(m["xlsx_path"], m["sheet_title"], thumb_cache)]
+
+
+def close_sinks(site, sinks, stats=None):
+    for sink in sinks:
+        sink.close()
+        if stats is not None:
+            for name, seconds in getattr(sink, "timings", {}).items():
+                stats.add(name, seconds)
+    if not sinks[0].count:
+        print(f"[ERROR] {MARKETPLACES[site]['name']} 没有成功抓取到任何商品信息。")
+
+
+def export_site(site, rows, thumb_cache=None):
+    """已有完整结果时一次性导出（店铺名称清洗 -> CSV -> 带图片的 Excel）"""
+    sinks = site_sinks(site, thumb_cache)
+    writer = OrderedWriter(sinks)
+    for idx, row in enumerate(rows):
+        writer.put(idx, row)
+    close_sinks(site, sinks)
+
+
+# ============ 抓取日志（续跑 / 重新导出） ============
+def open_journal(resume=None):
+    """新建本次运行的日志；resume 为 "latest" 或运行编号时接着该次运行写"""
+    run_id = None
+    if resume:
+        run_id = RunJournal.latest() if resume == "latest" else resume
+        if run_id is None:
+            print("[JOURNAL] 没有可续跑的运行，重新开始")
+    journal = RunJournal(run_id)
+    if run_id:
+        counts = {MARKETPLACES[s]["name"]: len(journal.rows(s)) for s in MARKETPLACES}
+        done = {name: n for name, n in counts.items() if n}
+        print(f"[JOURNAL] 续跑 {journal.run_id}，已完成：{done or '无'}")
+    else:
+        print(f"[JOURNAL] 结果实时写入 {journal.dir}，中断后可加 --resume 续跑")
+    return journal
+
+
+def rebuild_from_journal(run, sites):
+    """不启动浏览器，直接用日志中的结果重新导出各站点的 CSV / Excel"""
+    run_id = RunJournal.latest() if run == "latest" else run
+    if run_id is None or not os.path.isdir(os.path.join(JOURNAL_DIR, run_id)):
+        print(f"[ERROR] 找不到抓取日志：{run}")
+        return
+    journal = RunJournal(run_id)
+    print(f"[JOURNAL] 从 {journal.dir} 重新导出")
+    thumb_cache = ThumbCache()
+    for site in sites:
+        if os.path.exists(journal.path(site)):
+            export_site(site, journal.rows(site), thumb_cache)
+    thumb_cache.report()
+
+
+# ============ 离线重新解析（HTML 存档） ============
+def reparse_archive(sites, since=None, workers=PARSE_WORKERS):
+    """
+    不启动浏览器：用进程池（默认全部 CPU 核）按当前解析规则重新解析存档。
+    每个存档都写入新的抓取日志（保留历史），导出的 CSV / Excel 取每个商品最新的一份
+    """
+    paths = list(iter_archive(sites, since))
+    if not paths:
+        print("[ERROR] html_archive/ 中没有找到可重新解析的存档。")
+        return
+
+    journal = RunJournal(REPARSE_PREFIX + time.strftime("%Y%m%d-%H%M%S"), fsync=False)
+    t0 = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(reparse_file, paths, chunksize=8)
+        for idx, (site, url, row) in enumerate(tqdm(results, total=len(paths), desc="重新解析", unit="page")):
+            if row:
+                journal.append(site, idx, url, row)
+            else:
+                failed += 1
+    journal.close()
+    elapsed = time.perf_counter() - t0
+    print(
+        f"[REPARSE] 共 {len(paths)} 个页面，失败 {failed}，耗时 {elapsed:.1f} s"
+        f"（{len(paths) / elapsed:.1f} 页/秒），结果写入 {journal.dir}"
+    )
+
+    thumb_cache = ThumbCache()
+    for site in sites:
+        if os.path.exists(journal.path(site)):
+            export_site(site, journal.rows(site), thumb_cache)
+    thumb_cache.report()
+
+
+# ============ 主流程 ============
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fire-Maple Amazon 多站点商品信息采集")
+    parser.add_argument("--sites", default=",".join(MARKETPLACES), help="要抓取的站点，逗号分隔（默认全部）")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="每个站点的并发页面数")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS,
+                        help="解析进程数（默认 CPU 核数，0 表示不用进程池）")
+    parser.add_argument("--profile", choices=sorted(NETWORK_PROFILES), help="网络拦截方案，默认按站点配置")
+    parser.add_argument("--headless", action="store_true", help="无界面运行（需要已保存且有效的收货地址会话）")
+    parser.add_argument("--reset-address", action="store_true", help="忽略已保存的会话，重新手动设置收货地址")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="RUN",
+                        help="续跑上一次（或指定编号）的运行，日志中已完成的商品跳过")
+    parser.add_argument("--rebuild", nargs="?", const="latest", metavar="RUN",
+                        help="不抓取，直接从上一次（或指定编号）运行的日志重新导出 CSV / Excel")
+    parser.add_argument("--no-archive", action="store_true", default=not ARCHIVE_HTML,
+                        help="不保存原始 HTML 存档")
+    parser.add_argument("--no-http", action="store_true", default=not HTTP_TIER,
+                        help="不用 HTTP 直取，所有商品页都用浏览器打开")
+    parser.add_argument("--in-page", type=int, nargs="?", const=IN_PAGE_CONCURRENCY, default=0, metavar="N",
+                        help=f"商品页改用页面内 fetch() 直取（一个已设置收货地址的 page，不渲染），N 个同时进行"
+                             f"（默认 {IN_PAGE_CONCURRENCY}）；字段不全时照常用浏览器打开")
+    parser.add_argument("--reparse", action="store_true",
+                        help="不抓取，用当前解析规则重新解析 html_archive/ 中的存档并导出")
+    parser.add_argument("--since", metavar="YYYYMMDD", help="配合 --reparse：只解析该日期之后的存档")
+    parser.add_argument("--search", action="append", metavar="关键词",
+                        help="按关键词搜索发现商品并抓取详情（可多次指定；指定后不读 urls.txt）")
+    parser.add_argument("--brand", action="append", metavar="品牌", help="按品牌筛选搜索结果发现商品，如 Fire-Maple")
+    parser.add_argument("--store", action="append", metavar="URL", help="品牌店铺页链接（/stores/...），收集其中的商品")
+    parser.add_argument("--pages", type=int, default=DISCOVER_MAX_PAGES, help="每个搜索词 / 品牌最多翻几页")
+    parser.add_argument("--bestsellers", action="append", metavar="URL",
+                        help="只采集 Best Sellers 榜单页（排名、价格、评分、rating 数量），不打开商品页；可多次指定")
+    parser.add_argument("--bsr-pages", type=int, default=BESTSELLERS_MAX_PAGES, help="每个榜单翻几页（每页 50 名）")
+    parser.add_argument("--offers", action="store_true",
+                        help="同时采集每个商品的全部报价（卖家、价格、成色、发货方），写入 offers_<站点>.csv")
+    parser.add_argument("--reviews", action="store_true",
+                        help="只采集 urls.txt 中各商品的评论（按时间倒序翻页，增量：只抓上次之后的新评论）")
+    parser.add_argument("--reviews-since", metavar="YYYY-MM-DD", help="配合 --reviews：只要该日期及之后的评论")
+    parser.add_argument("--max-reviews", type=int, default=REVIEW_MAX_PER_ASIN, metavar="N",
+                        help="配合 --reviews：每个 ASIN 本次最多保存 N 条")
+    parser.add_argument("--reviews-format", choices=["jsonl", "parquet"], default="jsonl",
+                        help="评论输出格式（parquet 需要 pip install pyarrow）")
+    parser.add_argument("--due", action="store_true",
+                        help="只抓到期需要刷新的商品（刷新间隔按各商品的变化频率自动调整，见 firemaple_state.py）")
+    parser.add_argument("--budget", type=int, metavar="N", help="配合 --due：本次最多抓 N 个，优先超期最多的")
+    parser.add_argument("--live-stats", type=float, nargs="?", const=LIVE_STATS_INTERVAL, metavar="SECONDS",
+                        help=f"抓取过程中每隔若干秒打印各阶段耗时表（默认 {LIVE_STATS_INTERVAL:g} 秒）")
+    parser.add_argument("--bench-parse", nargs="+", metavar="HTML", help="对比新旧解析耗时（按 --sites 的第一个站点解析）")
+    args = parser.parse_args(argv)
+
+    args.sites = [s.strip().lower() for s in args.sites.split(",") if s.strip()]
+    unknown = [s for s in args.sites if s not in MARKETPLACES]
+    if unknown or not args.sites:
+        parser.error(f"未知站点：{', '.join(unknown)}（可选：{', '.join(MARKETPLACES)}）")
+    if args.reviews_since and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", args.reviews_since):
+        parser.error("--reviews-since 格式应为 YYYY-MM-DD")
+    if args.budget is not None and args.budget < 1:
+        parser.error("--budget 至少为 1")
+    return args
+
+
+def list_pool(context, site):
+    """榜单 / 评论采集用的 (SitePages, AdaptiveRateLimiter)：不开商品页，只借 context.request 直接请求列表页"""
+    return SitePages(context, site, MARKETPLACES[site]["block_profile"]), AdaptiveRateLimiter()
+
+
+async def run_bestsellers(args):
+    """--bestsellers：只采集榜单页，不打开商品页"""
+    site_urls = bestseller_urls(args.bestsellers, args.sites)
+    if not site_urls:
+        return
+    stats = StageStats()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=args.headless)
+        opened = await open_sites(browser, site_urls, args.reset_address, args.headless)
+        await asyncio.gather(
+            *(harvest_bestsellers(*list_pool(context, site), site_urls[site], args.bsr_pages, stats)
+              for site, (context, _) in opened.items())
+        )
+        await browser.close()
+    print(stats.table())
+
+
+async def run_reviews(args):
+    """--reviews：按 ASIN 增量采集评论，写入单独的 JSONL / Parquet"""
+    site_urls = read_urls(args.sites)
+    if not site_urls:
+        print("[ERROR] 没有找到可抓取的链接（urls.txt / urls_<站点>.txt）。")
+        return
+    try:
+        sinks = {site: review_sink(site, args.reviews_format) for site in site_urls}
+    except ImportError:
+        print("[ERROR] 输出 Parquet 需要 pyarrow：pip install pyarrow（或改用默认的 --reviews-format jsonl）")
+        return
+    stats = StageStats()
+    state = StateStore()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=args.headless)
+        opened = await open_sites(browser, site_urls, args.reset_address, args.headless)
+        harvesters = [
+            ReviewHarvester(*list_pool(context, site), sinks[site], state, args.workers, args.reviews_since, args.max_reviews, stats)
+            for site, (context, _) in opened.items()
+        ]
+        try:
+            await asyncio.gather(*(h.run(site_urls[h.site], i) for i, h in enumerate(harvesters)))
+        finally:
+            state.close()
+            for sink in sinks.values():
+                sink.close()
+        await browser.close()
+    print(stats.table())
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    if args.bench_parse:
+        bench_parse(args.bench_parse, site=args.sites[0])
+        return
+    if args.rebuild:
+        rebuild_from_journal(args.rebuild, args.sites)
+        return
+    if args.reparse:
+        reparse_archive(args.sites, args.since, args.parse_workers)
+        return
+
+    if args.bestsellers:
+        await run_bestsellers(args)
+        return
+    if args.reviews:
+        await run_reviews(args)
+        return
+
+    discovering = bool(args.search or args.brand or args.store)
+    if discovering:
+        site_urls = discovery_sources(args.sites, args.search or (), args.brand or (), args.store or (), args.pages)
+    else:
+        site_urls = read_urls(args.sites)
+    if not site_urls:
+        print("[ERROR] 没有找到可抓取的链接（urls.txt / urls_<站点>.txt）。")
+        return
+
+    state = StateStore()
+    if (args.due or args.budget is not None) and not discovering:
+        due = {site: DueUrls(urls, state, site, args.budget) for site, urls in site_urls.items()}
+        site_urls = {site: urls for site, urls in due.items() if urls.any()}
+        if not site_urls:
+            print("[SCHED] 没有到期需要刷新的商品。")
+            state.close()
+            return
+
+    journal = open_journal(args.resume)
+    thumb_cache = ThumbCache()  # 各站点共用：抓取时写入浏览器已下载的主图，导出 Excel 时直接命中
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=args.headless)
+
+        opened = await open_sites(browser, site_urls, args.reset_address, args.headless)
+        site_urls = {site: urls for site, urls in site_urls.items() if site in opened}
+
+        # 各站点并发抓取（每个站点独立的页面池和限速），结果按链接顺序边抓边写入 CSV / Excel
+        sinks = {site: site_sinks(site, thumb_cache) for site in site_urls}
+        stats = StageStats()
+        parse_pool = ProcessPoolExecutor(max_workers=args.parse_workers) if args.parse_workers > 0 else None
+        crawls = [
+            crawl_with_pool(
+                context, page, site_urls[site], site,
+                workers=args.workers, thumb_cache=thumb_cache, profile=args.profile, position=i,
+                journal=journal, sinks=sinks[site], parse_pool=parse_pool, archive=not args.no_archive,
+                stats=stats, http=not args.no_http, state=state, offers=OffersStage if args.offers else None,
+                in_page=args.in_page,
+            )
+            for i, (site, (context, page)) in enumerate(opened.items())
+        ]
+        monitor = LoopMonitor()
+        monitor.start()
+        live = asyncio.create_task(print_stats_live(stats, args.live_stats)) if args.live_stats else None
+        try:
+            await asyncio.gather(*crawls)
+        finally:
+            monitor.stop()
+            if live:
+                live.cancel()
+            if parse_pool:
+                parse_pool.shutdown()
+            journal.close()
+            state.close()
+            # 中断时也把已写出的部分保存下来
+            for site, site_sink in sinks.items():
+                close_sinks(site, site_sink, stats)
+            print(stats.table())
+            stats.write(os.path.join(journal.dir, STATS_FILE))
+
+        await browser.close()
+
+    thumb_cache.report()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_sites.py
+站点配置表：各 Amazon 站点的域名、语言、货币、地址提示和输出文件名。
+抓取引擎（firemaple_playwright.py）和解析模块都按这张表工作，新增站点只需在这里加一项。
+"""
+
+from urllib.parse import urlparse
+
+MARKETPLACES = {
+    "us": {
+        "name": "US",
+        "domain": "amazon.com",
+        "locale": "en-US",
+        "currency": "$",
+        "address_hint": "美国（建议邮编 10001）",
+        "csv_path": "firemaple_playwright_us.csv",
+        "xlsx_path": "firemaple_playwright_us.xlsx",
+        "sheet_title": "Fire-Maple US",
+        "block_profile": "lean",   # 网络拦截方案，见 firemaple_playwright.NETWORK_PROFILES
+        "fba_rule": "loose",       # "loose"：detect_fba 完整规则；"strict"：只认几种明确写法
+    },
+    "uk": {
+        "name": "UK",
+        "domain": "amazon.co.uk",
+        "locale": "en-GB",
+        "currency": "£",
+        "address_hint": "英国（建议邮编 SW1A 1AA）",
+        "csv_path": "firemaple_playwright_uk.csv",
+        "xlsx_path": "firemaple_playwright_uk.xlsx",
+        "sheet_title": "Fire-Maple UK",
+        "block_profile": "lean",
+        "fba_rule": "loose",
+    },
+    "au": {
+        "name": "AU",
+        "domain": "amazon.com.au",
+        "locale": "en-AU",
+        "currency": "$",
+        "address_hint": "澳洲（建议邮编 2000）",
+        "csv_path": "firemaple_playwright.csv",
+        "xlsx_path": "firemaple_playwright.xlsx",
+        "sheet_title": "Fire-Maple AU",
+        "block_profile": "lean",
+        "fba_rule": "strict",
+    },
+}
+
+
+def home_url(site):
+    return f"https://www.{MARKETPLACES[site]['domain']}/"
+
+
+def site_for_url(url):
+    """按链接域名判断站点（如 www.amazon.co.uk -> "uk"），识别不了返回 None"""
+    host = urlparse(url).netloc.lower().split(":")[0]
+    for site, m in MARKETPLACES.items():
+        if host == m["domain"] or host.endswith("." + m["domain"]):
+            return site
+    return None
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_stages.py
+商品页之外的采集阶段，和抓取引擎（firemaple_playwright.py）共用站点的 context 池（SitePages）与限速器：
+  - OffersStage：全部报价，作为 crawl_with_pool 的一个 sink，页面内 fetch 批量请求
+  - Discovery：关键词搜索 / 品牌筛选 / 品牌店铺页发现商品，作为 crawl_with_pool 的异步链接来源
+  - harvest_bestsellers：Best Sellers 榜单批量采集
+  - ReviewHarvester：按 ASIN 增量采集评论
+搜索页、榜单页、评论页都用 fetch_list_page 直接请求（不渲染）
+"""
+
+import asyncio
+import re
+import time
+from urllib.parse import urlencode
+
+from tqdm import tqdm
+
+from firemaple_sites import MARKETPLACES, home_url, site_for_url
+from firemaple_parse import (
+    parse_search_page, parse_store_asins, parse_bestsellers, parse_review_page, parse_offers, get_asin_from_url,
+    ASIN_RE, REVIEW_FIELDS, OFFER_FIELDS,
+)
+from firemaple_export import CsvSink, JsonlSink, ParquetSink
+from firemaple_fetch import (
+    BLOCK_HTML_RE, BLOCK_RETRIES, BLOCK_RETRY_DELAY, BlockedError, InPageFetcher, check_blocked, http_get,
+)
+from firemaple_stats import span
+from firemaple_urls import AsinSet, canonical_url
+
+
+# ============ 全部报价（页面内 fetch 批量请求） ============
+OFFERS_BATCH = 5              # 一次 page.evaluate 同时 fetch 几个报价片段
+OFFERS_MAX_PAGES = 3          # 每个 ASIN 的报价最多翻几页（每页 10 个）
+OFFERS_CSV = "offers_{site}.csv"
+
+
+def offers_url(site, asin, page_no=1):
+    """商品页 “Other sellers on Amazon” 弹层（All Offers Display）的片段地址"""
+    return f"{home_url(site)}gp/aod/ajax/?asin={asin}&pc=dp&experienceId=aodAjaxMain&pageno={page_no}"
+
+
+class OffersStage:
+    """
+    全部报价采集，作为 crawl_with_pool 的一个 sink：商品行按顺序写出时把 ASIN 排进待办，
+    后台任务借一个停在站点首页的 page，用页面内 fetch() 一次请求 OFFERS_BATCH 个报价片段
+    （同源请求，带收货地址 cookies，不为每个 ASIN 打开商品页），解析后写入 offers_<站点>.csv。
+    报价行带 站点 / 亚马逊ASIN / 链接，与商品 CSV 的行对应；报价超过一页的 ASIN 接着请求下一页（最多 max_pages）
+    """
+
+    def __init__(self, pool, limiter, stats=None, max_pages=OFFERS_MAX_PAGES):
+        self.pool = pool
+        self.limiter = limiter
+        self.stats = stats
+        self.site = pool.site
+        self.max_pages = max_pages
+        self.sink = CsvSink(OFFERS_CSV.format(site=self.site), OFFER_FIELDS)
+        self.asins = self.requests = self.failed = 0
+        self._todo = asyncio.Queue()  # (ASIN, 页码)，None 表示商品已全部写出
+        self._seen = AsinSet()
+        self._fetcher = InPageFetcher(pool, concurrency=1)  # 自己的 page，不和商品页的 fetch 抢
+        self._task = None
+
+    def write(self, row):
+        asin = row.get("亚马逊ASIN")
+        if asin and ASIN_RE.fullmatch(asin) and self._seen.add(asin):
+            self.asins += 1
+            self._todo.put_nowait((asin, 1))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def finish(self):
+        """商品抓完后调用：等待报价全部请求完，关闭输出"""
+        self._todo.put_nowait(None)
+        try:
+            await self._task
+        finally:
+            await self._fetcher.close()
+            self.sink.close()
+        print(
+            f"[OFFERS] {MARKETPLACES[self.site]['name']}：{self.asins} 个 ASIN，页面内请求 {self.requests} 次，"
+            f"报价 {self.sink.count} 条" + (f"，失败 {self.failed} 个" if self.failed else "")
+        )
+
+    async def _next_batch(self):
+        """等到第一个待办后，再带上已在排队的，最多 OFFERS_BATCH 个；商品已全部写出且没有待办时返回 None"""
+        batch = []
+        while len(batch) < OFFERS_BATCH:
+            if batch and self._todo.empty():
+                break
+            item = await self._todo.get()
+            if item is None:
+                if self._todo.empty() and not batch:
+                    return None
+                self._todo.put_nowait(None)  # 还有翻页产生的待办，结束标记放回队尾
+                if batch:
+                    break
+                continue
+            batch.append(item)
+        return batch
+
+    async def _fetch(self, batch):
+        """页面内并发请求一批报价片段：返回 {(ASIN, 页码): html}；遇到风控的降速、换 context 后重试"""
+        done = {}
+        for tries in range(BLOCK_RETRIES + 1):
+            with span(self.stats, "限速等待"):
+                for _ in batch:
+                    await self.limiter.acquire()
+            try:
+                with span(self.stats, "报价请求"):
+                    results, gen = await self._fetcher.fetch_all(offers_url(self.site, asin, n) for asin, n in batch)
+            except Exception as e:
+                print(f"\n[ERROR] {MARKETPLACES[self.site]['name']} 报价请求失败：{e}")
+                return done
+            self.requests += len(batch)
+            blocked = []
+            for item, (status, html) in zip(batch, results):
+                if status in (429, 503) or BLOCK_HTML_RE.search(html):
+                    blocked.append(item)
+                elif 200 <= status < 300:
+                    done[item] = html
+            if not blocked:
+                self.limiter.success()
+                return done
+            if await self.pool.rotate(gen):
+                self.limiter.backoff()
+            await asyncio.sleep(BLOCK_RETRY_DELAY * 2 ** tries)
+            batch = blocked
+        return done
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch is None:
+                return
+            pages = await self._fetch(batch)
+            for asin, page_no in batch:
+                html = pages.get((asin, page_no))
+                if html is None:
+                    if page_no == 1:
+                        self.failed += 1
+                    continue
+                with span(self.stats, "解析报价"):
+                    offers, total = parse_offers(html, self.site, asin, page_no)
+                for offer in offers:
+                    self.sink.write(offer)
+                if total and page_no < self.max_pages and total > page_no * 10:
+                    self._todo.put_nowait((asin, page_no + 1))
+
+
+# ============ 关键词搜索 / 品牌店铺发现 ============
+DISCOVER_MAX_PAGES = 20              # 每个搜索词 / 品牌最多翻几页
+STORE_SCROLLS = 5                    # 品牌店铺页向下滚动几次（商品是滚动时懒加载的）
+DISCOVERED_CSV = "discovered_{site}.csv"
+DISCOVER_COLUMNS = ["来源", "页码", "位置", "亚马逊ASIN", "链接", "价格", "评分", "rating数量", "广告", "产品图片"]
+
+
+def search_url(site, query=None, brand=None):
+    """站点搜索链接；brand 用品牌筛选（p_89），可和关键词同时使用"""
+    params = {}
+    if query:
+        params["k"] = query
+    if brand:
+        params["rh"] = f"p_89:{brand}"
+    return f"{home_url(site)}s?{urlencode(params)}"
+
+
+async def fetch_list_page(pool, limiter, url, stats=None, stage="搜索页"):
+    """
+    用站点 context 直接请求搜索页 / 榜单页（不渲染，带收货地址 cookies）；
+    遇到验证码时降速、更换 context 后重试，仍不行返回 None
+    """
+    site = pool.site
+    for tries in range(BLOCK_RETRIES + 1):
+        with span(stats, "限速等待"):
+            await limiter.acquire()
+        try:
+            async with pool.borrow() as (context, gen):  # gen 为发出请求时的代数，遇到验证码时只换这一代
+                with span(stats, stage):
+                    status, html = await http_get(context.request, site)(url)
+        except Exception as e:
+            print(f"\n[ERROR] {stage} {url} 请求失败：{e}")
+            return None
+        if status in (429, 503) or BLOCK_HTML_RE.search(html):
+            # 同一代 context 上同时遇到验证码的请求只换一次 context、只降速一次
+            if await pool.rotate(gen):
+                limiter.backoff()
+            await asyncio.sleep(BLOCK_RETRY_DELAY * 2 ** tries)
+            continue
+        if not 200 <= status < 300:
+            print(f"\n[ERROR] {stage} {url} 返回 HTTP {status}")
+            return None
+        limiter.success()
+        return html
+    print(f"\n[ERROR] {stage} {url} 连续 {BLOCK_RETRIES + 1} 次遇到风控，跳过")
+    return None
+
+
+class Discovery:
+    """
+    按关键词搜索、品牌筛选或品牌店铺页发现商品，作为异步链接来源交给 crawl_with_pool：
+    每翻一页就把新发现的商品链接交给抓取 worker，搜索翻页和详情页抓取同时进行。
+    - 搜索页用站点 context 直接请求（不渲染），自动翻页直到没有下一页或 max_pages
+    - 店铺页（/stores/...）由脚本渲染，借一个 page 打开并滚动加载后收集其中的 ASIN
+    - 搜索结果卡片上已有的价格、评分、rating 数量写入 discovered_<站点>.csv
+    """
+
+    def __init__(self, site, queries=(), brands=(), stores=(), max_pages=DISCOVER_MAX_PAGES):
+        self.site = site
+        self.starts = [(q, search_url(site, query=q)) for q in queries]
+        self.starts += [(f"品牌:{b}", search_url(site, brand=b)) for b in brands]
+        self.stores = list(stores)
+        self.max_pages = max_pages
+        self.pages = self.found = self.duplicates = 0
+        self.csv_path = DISCOVERED_CSV.format(site=site)
+        self.pool = self.limiter = self.stats = self.parse_pool = None
+
+    def bind(self, pool, limiter, stats=None, parse_pool=None):
+        """由 crawl_with_pool 调用：和抓取 worker 共用 context（收货地址）、限速器和解析进程池"""
+        self.pool, self.limiter, self.stats, self.parse_pool = pool, limiter, stats, parse_pool
+
+    async def _store_asins(self, url):
+        """打开品牌店铺页，滚动加载后收集全部 ASIN"""
+        slot = await self.pool.attach()
+        page = slot[0]
+        try:
+            with span(self.stats, "限速等待"):
+                await self.limiter.acquire()
+            with span(self.stats, "店铺页"):
+                resp = await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+                await check_blocked(page, resp)
+                for _ in range(STORE_SCROLLS):
+                    await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+                    await page.wait_for_timeout(800)
+                html = await page.content()
+        except Exception as e:
+            if isinstance(e, BlockedError):
+                self.limiter.backoff()
+            print(f"\n[ERROR] 店铺页 {url} 打开失败：{e}")
+            return []
+        finally:
+            await self.pool.detach(slot)
+        return parse_store_asins(html)
+
+    async def _parse(self, html, url):
+        if self.parse_pool is None:
+            return parse_search_page(html, url)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_pool, parse_search_page, html, url)
+
+    async def __aiter__(self):
+        seen = AsinSet()
+        cards_out = CsvSink(self.csv_path, DISCOVER_COLUMNS)
+        try:
+            for label, url in self.starts:
+                for page_no in range(1, self.max_pages + 1):
+                    html = await fetch_list_page(self.pool, self.limiter, url, self.stats)
+                    if html is None:
+                        break
+                    with span(self.stats, "解析搜索页"):
+                        cards, next_url = await self._parse(html, url)
+                    self.pages += 1
+                    for pos, card in enumerate(cards, 1):
+                        link = canonical_url(self.site, card["亚马逊ASIN"])
+                        cards_out.write({**card, "来源": label, "页码": page_no, "位置": pos, "链接": link})
+                        if seen.add(card["亚马逊ASIN"]):
+                            self.found += 1
+                            yield link
+                        else:
+                            self.duplicates += 1
+                    if not cards or not next_url:
+                        break
+                    url = next_url
+            for store in self.stores:
+                for asin in await self._store_asins(store):
+                    cards_out.write({"来源": store, "亚马逊ASIN": asin, "链接": canonical_url(self.site, asin)})
+                    if seen.add(asin):
+                        self.found += 1
+                        yield canonical_url(self.site, asin)
+                    else:
+                        self.duplicates += 1
+        finally:
+            cards_out.close()
+
+    def report(self):
+        print(
+            f"[DISCOVER] {MARKETPLACES[self.site]['name']}：搜索 {self.pages} 页，发现 {self.found} 个商品"
+            f"（重复 {self.duplicates}），搜索卡片信息见 {self.csv_path}"
+        )
+
+
+def discovery_sources(sites, queries=(), brands=(), stores=(), max_pages=DISCOVER_MAX_PAGES):
+    """按命令行参数为各站点建立 Discovery；店铺链接按域名归到对应站点"""
+    sources = {}
+    for site in sites:
+        site_stores = [u for u in stores if site_for_url(u) == site]
+        if queries or brands or site_stores:
+            sources[site] = Discovery(site, queries, brands, site_stores, max_pages)
+    return sources
+
+
+# ============ Best Sellers 榜单批量采集 ============
+BESTSELLERS_MAX_PAGES = 2     # 每个榜单翻几页（每页 50 名，Amazon 只公开前 100 名）
+BESTSELLERS_CSV = "bestsellers_{site}.csv"
+
+
+async def harvest_bestsellers(pool, limiter, urls, max_pages=BESTSELLERS_MAX_PAGES, stats=None):
+    """
+    不打开商品页：直接请求 Best Sellers 榜单页，一次请求拿到最多 50 个商品的排名、ASIN、价格、评分和 rating 数量，
+    按和 CSV 相同的列写入 bestsellers_<站点>.csv。每个商品的请求数约为逐个抓详情页的 1/50，适合批量跟踪竞品。
+    pool（SitePages）和 limiter 由引擎按站点建立
+    """
+    site = pool.site
+    sink = CsvSink(BESTSELLERS_CSV.format(site=site))
+    requests_made = 0
+    t0 = time.perf_counter()
+    try:
+        for url in urls:
+            for _ in range(max_pages):
+                html = await fetch_list_page(pool, limiter, url, stats, stage="榜单页")
+                if html is None:
+                    break
+                requests_made += 1
+                with span(stats, "解析榜单页"):
+                    category, rows, next_url = parse_bestsellers(html, url, site)
+                for row in rows:
+                    sink.write(row)
+                print(f"[BSR] {MARKETPLACES[site]['name']} {category or url}：{len(rows)} 个商品")
+                if not rows or not next_url:
+                    break
+                url = next_url
+    finally:
+        sink.close()
+    if requests_made:
+        elapsed = time.perf_counter() - t0
+        print(
+            f"[BSR] {MARKETPLACES[site]['name']}：{requests_made} 次请求采集 {sink.count} 个商品"
+            f"（平均每次请求 {sink.count / requests_made:.0f} 个，每个商品 {elapsed / max(sink.count, 1):.2f} s）"
+        )
+
+
+def bestseller_urls(urls, sites):
+    """榜单链接按域名分到各站点，不属于 sites 的跳过"""
+    grouped = {}
+    for url in urls:
+        site = site_for_url(url)
+        if site in sites:
+            grouped.setdefault(site, []).append(url)
+        else:
+            print(f"[WARN] 榜单链接 {url} 不属于本次抓取的站点，已跳过")
+    return grouped
+
+
+# ============ 评论采集（按 ASIN 翻页，增量） ============
+REVIEW_PAGES_IN_FLIGHT = 3    # 每个 ASIN 同时请求的评论页数（按窗口翻页，窗口内并发）
+REVIEW_MAX_PAGES = 10         # 每个 ASIN 最多翻几页（Amazon 每种排序只给前 10 页，每页 10 条）
+REVIEW_MAX_PER_ASIN = None    # 每个 ASIN 最多保存多少条新评论，None 为不限
+REVIEWS_JSONL = "reviews_{site}.jsonl"
+REVIEWS_PARQUET = "reviews_{site}_{ts}.parquet"
+REVIEW_LOGIN_RE = re.compile(r'name="signIn"|id="ap_email"')
+
+
+def review_page_url(site, asin, page_no):
+    """按时间倒序的评论页（最新的在前，增量抓取遇到已有评论即可停止）"""
+    return f"{home_url(site)}product-reviews/{asin}/?sortBy=recent&reviewerType=all_reviews&pageNumber={page_no}"
+
+
+def review_sink(site, fmt):
+    """评论输出：jsonl 追加到 reviews_<站点>.jsonl；parquet 每次运行写一个新文件"""
+    if fmt == "parquet":
+        return ParquetSink(REVIEWS_PARQUET.format(site=site, ts=time.strftime("%Y%m%d-%H%M%S")), REVIEW_FIELDS)
+    return JsonlSink(REVIEWS_JSONL.format(site=site))
+
+
+class ReviewHarvester:
+    """
+    单个站点的评论采集：workers 个协程各负责一个 ASIN，每个 ASIN 一次请求 REVIEW_PAGES_IN_FLIGHT 页评论，
+    按页码顺序处理；已有上次记录的 ASIN 通常只有几条新评论，先只请求第 1 页，整页都是新评论才放宽到一次多页。
+    遇到以下情况停止翻页：
+    - 没有下一页 / 达到 REVIEW_MAX_PAGES
+    - 评论日期早于 since（YYYY-MM-DD）
+    - 本次已保存 max_reviews 条
+    - 遇到上次已抓到的评论（state 中记录的最新评论），即增量运行只抓新评论
+    评论逐条写入 sink，不在内存里累积；所有请求共用站点的限速器和 context（pool / limiter 由引擎按站点建立，见 fetch_list_page）
+    """
+
+    def __init__(self, pool, limiter, sink, state, workers, since=None, max_reviews=REVIEW_MAX_PER_ASIN,
+                 stats=None):
+        self.pool = pool
+        self.limiter = limiter
+        self.site = pool.site
+        self.sink = sink
+        self.state = state
+        self.since = since
+        self.max_reviews = max_reviews
+        self.workers = workers
+        self.stats = stats
+        self.asins = self.pages = self.saved = self.up_to_date = 0
+        self.login_required = False
+
+    def _parse(self, html, asin):
+        with span(self.stats, "解析评论页"):
+            return parse_review_page(html, self.site, asin)
+
+    async def crawl_asin(self, asin):
+        """抓一个 ASIN 的新评论，返回保存的条数"""
+        mark_date, mark_ids = self.state.review_mark(self.site, asin)
+        newest_date, newest_ids = None, set()
+        count = 0
+        page_no = 1
+        width = 1 if mark_date or mark_ids else REVIEW_PAGES_IN_FLIGHT
+        done = False
+        while not done and page_no <= REVIEW_MAX_PAGES:
+            window = range(page_no, min(page_no + width, REVIEW_MAX_PAGES + 1))
+            htmls = await asyncio.gather(
+                *(fetch_list_page(self.pool, self.limiter, review_page_url(self.site, asin, n), self.stats, "评论页")
+                  for n in window)
+            )
+            for html in htmls:
+                if html is None or self.login_required:
+                    done = True
+                    break
+                if REVIEW_LOGIN_RE.search(html):
+                    self.login_required = True
+                    done = True
+                    break
+                self.pages += 1
+                reviews, has_next = self._parse(html, asin)
+                for review in reviews:
+                    date = review["日期"]
+                    if review["评论ID"] in mark_ids or date and mark_date and date < mark_date:
+                        if not count:
+                            self.up_to_date += 1
+                        done = True
+                        break
+                    if date and self.since and date < self.since:
+                        done = True
+                        break
+                    self.sink.write(review)
+                    count += 1
+                    if date and (newest_date is None or date > newest_date):
+                        newest_date, newest_ids = date, {review["评论ID"]}
+                    elif date and date == newest_date:
+                        newest_ids.add(review["评论ID"])
+                    if self.max_reviews and count >= self.max_reviews:
+                        done = True
+                        break
+                if done or not reviews or not has_next:
+                    done = True
+                    break
+            page_no += len(window)
+            width = REVIEW_PAGES_IN_FLIGHT  # 这一批里没遇到上次的评论，新评论较多，之后一次请求多页
+        if count:
+            self.state.save_review_mark(self.site, asin, newest_date, newest_ids, count)
+        return count
+
+    async def _worker(self, asins, pbar):
+        for asin in asins:
+            if self.login_required:
+                return
+            saved = await self.crawl_asin(asin)
+            self.asins += 1
+            self.saved += saved
+            pbar.update(1)
+            pbar.set_postfix_str(f"新评论 {self.saved} 条 {self.limiter.postfix()}", refresh=False)
+
+    async def run(self, urls, position=0):
+        # 各 worker 共用一个生成器，依次领取下一个 ASIN（取不到 ASIN 的链接跳过）
+        asins = (asin for asin in map(get_asin_from_url, urls) if asin)
+        desc = f"{MARKETPLACES[self.site]['name']} 评论"
+        with tqdm(desc=desc, unit="ASIN", position=position) as pbar:
+            await asyncio.gather(*(self._worker(asins, pbar) for _ in range(self.workers)))
+        if hasattr(urls, "report"):
+            urls.report()
+        if self.login_required:
+            print(
+                f"[WARN] {MARKETPLACES[self.site]['name']}：评论页要求登录，请加 --reset-address 在弹出的窗口中"
+                f"登录 Amazon 账号后再设置收货地址（会话保存到 session/ 后即可无界面采集）"
+            )
+        print(
+            f"[REVIEW] {MARKETPLACES[self.site]['name']}：{self.asins} 个 ASIN，请求 {self.pages} 页，"
+            f"新评论 {self.saved} 条（{self.up_to_date} 个 ASIN 没有新评论）；"
+            f"结束时速率 {self.limiter.rate * 60:.0f} 次/分，遇到限流 {self.limiter.backoffs} 次"
+        )
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_state.py
+每个 ASIN 的最新状态（价格、rating 数量、卖家、BSR）和刷新间隔，存在本地 SQLite（state.sqlite3）。
+每抓到一次就和上次比较：有变化刷新间隔减半，没变化逐步拉长（REFRESH_MIN_H ~ REFRESH_MAX_H 小时）。
+加 --due 运行时只抓已到期的商品，经常变动的竞品刷新得勤，几乎不动的自家商品隔几天才看一次。
+另外记录每个 ASIN 已抓到的最新评论（日期和当天的评论 ID），下次 --reviews 只抓比它新的评论。
+"""
+
+import heapq
+import json
+import re
+import sqlite3
+import time
+
+from firemaple_journal import item_key
+from firemaple_parse import normalize_seller_name
+from firemaple_sites import MARKETPLACES
+
+STATE_PATH = "state.sqlite3"
+REFRESH_START_H = 24      # 新商品抓到第一次后的刷新间隔（小时）
+REFRESH_MIN_H = 1         # 变化频繁的商品最短多久刷新一次
+REFRESH_MAX_H = 24 * 7    # 一直不变的商品最长多久刷新一次
+REFRESH_GROW = 1.5        # 没有变化时间隔乘以这个系数；有变化时减半
+RANK_TOLERANCE = 0.2      # BSR 主排名变动不超过 20% 不算变化（排名每小时都在小幅波动）
+LOOKUP_BATCH = 500        # 排期时每次查询多少个商品（WHERE key IN (...)，SQLite 变量数上限 999）
+
+# 结果行字段 -> 状态表列名
+TRACKED = {"价格": "price", "rating数量": "rating_count", "店铺名称": "seller", "类目&排名": "bsr"}
+
+_RANK_RE = re.compile(r"([\d,]+)\s+in\s")
+
+
+def main_rank(bsr):
+    """类目&排名里的第一个排名数字，没有返回 None"""
+    m = _RANK_RE.search(bsr or "")
+    return int(m.group(1).replace(",", "")) if m else None
+
+
+def changed_fields(old, row):
+    """和上次相比变化了的字段"""
+    changed = []
+    for field, col in TRACKED.items():
+        before, now = old[col], row.get(field)
+        if before == now:
+            continue
+        if col == "bsr":
+            a, b = main_rank(before), main_rank(now)
+            if a and b and abs(b - a) <= a * RANK_TOLERANCE:
+                continue
+        changed.append(field)
+    return changed
+
+
+class StateStore:
+    """按 (站点, ASIN) 保存最近一次看到的字段、刷新间隔和下次到期时间"""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                site TEXT NOT NULL,
+                key TEXT NOT NULL,
+                price TEXT, rating_count TEXT, seller TEXT, bsr TEXT,
+                last_seen REAL, last_changed REAL,
+                interval_h REAL, next_due REAL,
+                checks INTEGER DEFAULT 0, changes INTEGER DEFAULT 0,
+                PRIMARY KEY (site, key)
+            )"""
+        )
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS reviews (
+                site TEXT NOT NULL,
+                asin TEXT NOT NULL,
+                newest_date TEXT, newest_ids TEXT,
+                last_fetched REAL, total INTEGER DEFAULT 0,
+                PRIMARY KEY (site, asin)
+            )"""
+        )
+
+    def get(self, site, key):
+        return self.db.execute("SELECT * FROM items WHERE site = ? AND key = ?", (site, key)).fetchone()
+
+    def observe(self, site, url, row, now=None):
+        """记录一次抓取结果，按是否变化调整刷新间隔；返回变化了的字段（新商品返回 []）"""
+        now = now or time.time()
+        key = item_key(url)
+        old = self.get(site, key)
+        row = dict(row, 店铺名称=normalize_seller_name(row.get("店铺名称")))  # 和导出时一样清洗，避免重复店名算作变化
+        values = [row.get(field) for field in TRACKED]
+        if old is None:
+            changed, interval, checks, changes, last_changed = [], REFRESH_START_H, 1, 0, now
+        else:
+            changed = changed_fields(old, row)
+            if changed:
+                interval = max(REFRESH_MIN_H, old["interval_h"] / 2)
+                last_changed = now
+            else:
+                interval = min(REFRESH_MAX_H, old["interval_h"] * REFRESH_GROW)
+                last_changed = old["last_changed"]
+            checks, changes = old["checks"] + 1, old["changes"] + bool(changed)
+        self.db.execute(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (site, key, *values, now, last_changed, interval, now + interval * 3600, checks, changes),
+        )
+        self.db.commit()
+        return changed
+
+    def overdue(self, site, url, now=None):
+        """超期程度：(现在 - 上次抓取) / 刷新间隔，>= 1 表示到期；没抓过的商品为 inf"""
+        return self.overdue_many(site, [url], now)[0]
+
+    def overdue_many(self, site, urls, now=None):
+        """一批链接的超期程度（同 overdue），一次查询；urls 不要超过 LOOKUP_BATCH 个"""
+        now = now or time.time()
+        keys = [item_key(url) for url in urls]
+        found = {
+            row["key"]: (now - row["last_seen"]) / (row["interval_h"] * 3600)
+            for row in self.db.execute(
+                f"SELECT key, last_seen, interval_h FROM items WHERE site = ? AND key IN ({','.join('?' * len(keys))})",
+                (site, *keys),
+            )
+        }
+        return [found.get(key, float("inf")) for key in keys]
+
+    def review_mark(self, site, asin):
+        """已抓到的最新评论：(日期 YYYY-MM-DD, 该日期已抓到的评论 ID 集合)；没抓过返回 (None, set())"""
+        old = self.db.execute("SELECT * FROM reviews WHERE site = ? AND asin = ?", (site, asin)).fetchone()
+        if old is None:
+            return None, set()
+        return old["newest_date"], set(json.loads(old["newest_ids"] or "[]"))
+
+    def save_review_mark(self, site, asin, date, ids, count, now=None):
+        """本次抓到 count 条新评论，其中最新日期为 date、该日期的评论 ID 为 ids（和旧记录同一天时合并）"""
+        old_date, old_ids = self.review_mark(site, asin)
+        if date is None or old_date and old_date > date:
+            date, ids = old_date, old_ids
+        elif date == old_date:
+            ids = set(ids) | old_ids
+        self.db.execute(
+            """INSERT INTO reviews VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (site, asin) DO UPDATE SET newest_date = excluded.newest_date,
+                   newest_ids = excluded.newest_ids, last_fetched = excluded.last_fetched,
+                   total = total + excluded.total""",
+            (site, asin, date, json.dumps(sorted(ids or ())), now or time.time(), count),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class DueUrls:
+    """
+    包装 UrlSource：只产出已到期（或从没抓过）的链接，顺序不变。状态按 LOOKUP_BATCH 个一批查询。
+    指定 budget 时本次最多抓 budget 个，优先超期最多的：只扫一遍链接，内存里只保留选中的 budget 个，
+    选中结果算一次后缓存（any() 和之后的抓取共用，不再重读链接文件）
+    """
+
+    def __init__(self, source, store, site, budget=None, now=None):
+        self.source = source
+        self.store = store
+        self.site = site
+        self.budget = budget
+        self.now = now or time.time()
+        self.total = self.due = self.selected = 0
+        self._chosen = None  # budget 模式下选中的链接（按文件顺序）
+
+    def _due(self):
+        """逐批查状态，产出 (序号, 超期程度, 链接)，只含已到期的；同时更新 total / due"""
+        self.total = self.due = 0
+        batch = []
+        for url in self.source:
+            batch.append(url)
+            if len(batch) >= LOOKUP_BATCH:
+                yield from self._score(batch)
+                batch = []
+        if batch:
+            yield from self._score(batch)
+
+    def _score(self, batch):
+        for url, score in zip(batch, self.store.overdue_many(self.site, batch, self.now)):
+            seq = self.total
+            self.total += 1
+            if score >= 1:
+                self.due += 1
+                yield seq, score, url
+
+    def _select(self):
+        if self.budget <= 0:
+            return []
+        heap = []  # (超期程度, -序号, 链接)，最多 budget 个；超期相同时先淘汰靠后的
+        for seq, score, url in self._due():
+            item = (score, -seq, url)
+            if len(heap) < self.budget:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+        return [url for _, _, url in sorted(heap, key=lambda item: -item[1])]
+
+    def __iter__(self):
+        if self.budget is None:
+            self.selected = 0
+            for _, _, url in self._due():
+                self.selected += 1
+                yield url
+            return
+        if self._chosen is None:
+            self._chosen = self._select()
+            self.selected = len(self._chosen)
+        yield from self._chosen
+
+    def any(self):
+        return next(iter(self), None) is not None
+
+    def report(self):
+        self.source.report()
+        extra = f"，按预算只抓 {self.selected} 个" if self.budget is not None and self.selected < self.due else ""
+        print(f"[SCHED] {MARKETPLACES[self.site]['name']}：共 {self.total} 个商品，到期 {self.due} 个{extra}")
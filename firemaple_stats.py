@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_stats.py
+分阶段耗时统计：打开页面、等待、取 HTML、解析（含各字段）、存档、写日志、下载图片、保存 Excel 等
+每一步记一次耗时，运行结束输出 p50 / p95 / p99 和耗时分布（JSON），也可以在抓取过程中定时打印表格。
+"""
+
+import json
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# 耗时分布的分桶上限（毫秒），最后一桶为“更慢”
+HIST_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+def _percentile(sorted_values, q):
+    """最近秩法分位数"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+class StageStats:
+    """按阶段收集耗时样本（秒）；阶段名按首次出现的顺序输出"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def summary(self):
+        out = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            hist = [0] * (len(HIST_BUCKETS_MS) + 1)
+            for v in ordered:
+                hist[bisect_left(HIST_BUCKETS_MS, v * 1000)] += 1
+            out[stage] = {
+                "count": len(ordered),
+                "total_s": round(sum(ordered), 3),
+                "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+                "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+                "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+                "hist_ms": {
+                    (f"<={b}" if i < len(HIST_BUCKETS_MS) else f">{HIST_BUCKETS_MS[-1]}"): n
+                    for i, (b, n) in enumerate(zip(HIST_BUCKETS_MS + [None], hist))
+                    if n
+                },
+            }
+        return out
+
+    def table(self):
+        """控制台表格（各阶段次数、总耗时、p50/p95/p99）"""
+        lines = [f"{'阶段':<14}{'次数':>8}{'总耗时s':>10}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}"]
+        for stage, s in self.summary().items():
+            lines.append(
+                f"{stage:<14}{s['count']:>8}{s['total_s']:>10.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        print(f"[STATS] 各阶段耗时分布已写入 {path}")
+
+
+def span(stats, stage):
+    """stats 为 None 时不计时"""
+    return stats.span(stage) if stats is not None else nullcontext()
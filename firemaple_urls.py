@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+firemaple_urls.py
+链接输入：逐行流式读取 urls.txt / urls_<站点>.txt，每行规范化为 站点 + ASIN，去重后交给抓取引擎。
+  - 同一商品带不同追踪参数（ref=、th=、psc= 等）的链接只抓一次
+  - 支持直接写 ASIN：urls_<站点>.txt 里的 B0XXXXXXXX，或任意文件里的 uk:B0XXXXXXXX（图书为 10 位 ISBN）
+  - 不把整个文件读进内存；去重用紧凑的整数哈希表（每个 ASIN 约 16~32 字节），几百万行也没问题
+"""
+
+import os
+import re
+from array import array
+
+from firemaple_sites import MARKETPLACES, site_for_url
+from firemaple_parse import get_asin_from_url
+
+# 单独一行 ASIN，可带站点前缀：B0ABCDEFGH / uk:B0ABCDEFGH；图书的 ASIN 是 10 位 ISBN（末位可为 X）。
+# 只认大写，免得把 helloworld 这类 10 个字母的单词当成 ASIN 去抓
+BARE_ASIN_RE = re.compile(r"(?:([a-z]{2}):)?(B0[A-Z0-9]{8}|\d{9}[\dX])")
+REJECT_SAMPLES = 5  # 报告里列出的无法识别的行数
+
+_HASH_MUL = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+def canonical_url(site, asin):
+    """规范链接：https://www.<站点域名>/dp/<ASIN>"""
+    return f"https://www.{MARKETPLACES[site]['domain']}/dp/{asin}"
+
+
+def parse_line(line, default_site=None):
+    """
+    一行输入 -> (站点, ASIN, 链接)；空行或识别不了站点返回 None。
+    取不到 ASIN 的链接（短链等）原样保留，ASIN 为 None
+    """
+    text = line.strip()
+    if not text:
+        return None
+    m = BARE_ASIN_RE.fullmatch(text)
+    if m:
+        site = m.group(1) or default_site
+        if site not in MARKETPLACES:
+            return None
+        asin = m.group(2)
+        return site, asin, canonical_url(site, asin)
+    if not text.lower().startswith(("http://", "https://")):
+        return None
+    site = site_for_url(text) or default_site
+    if site is None:
+        return None
+    asin = get_asin_from_url(text)
+    if asin:
+        return site, asin, canonical_url(site, asin)
+    return site, None, text
+
+
+class AsinSet:
+    """
+    ASIN 去重集合：ASIN 按 36 进制压成整数，存进 array("q") 开放寻址表（线性探测，负载不超过一半），
+    每个 ASIN 占 16~32 字节；Python 的 set[str] 每个约 100 字节
+    """
+
+    def __init__(self, capacity=1024):
+        self._bits = max(4, (capacity - 1).bit_length())
+        self._table = array("q", bytes(8 << self._bits))
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _slot(self, v):
+        return ((v * _HASH_MUL) & _MASK64) >> (64 - self._bits)
+
+    def _insert(self, v):
+        table, mask = self._table, (1 << self._bits) - 1
+        i = self._slot(v)
+        while table[i]:
+            if table[i] == v:
+                return False
+            i = (i + 1) & mask
+        table[i] = v
+        return True
+
+    def add(self, asin):
+        """新 ASIN 返回 True，已存在返回 False"""
+        v = int(asin, 36) + 1  # 0 表示空位
+        if not self._insert(v):
+            return False
+        self._len += 1
+        if self._len * 2 > len(self._table):
+            old = self._table
+            self._bits += 1
+            self._table = array("q", bytes(8 << self._bits))
+            for v in old:
+                if v:
+                    self._insert(v)
+        return True
+
+    def nbytes(self):
+        return self._table.itemsize * len(self._table)
+
+
+class UrlSource:
+    """
+    某个站点的链接来源。每次迭代都重新流式读取文件，产出去重后的规范链接（保持文件中的顺序）；
+    迭代结束后 lines / duplicates / unknown 为本次读取的统计，rejected 为前几条无法识别的行（文件:行号: 内容）
+    """
+
+    def __init__(self, site, paths, warn_unknown=False):
+        self.site = site
+        self.paths = paths  # [(文件, 该文件默认站点或 None)]
+        self.warn_unknown = warn_unknown  # 多个站点读同一个 urls.txt 时，只让一个站点报告无法识别的行
+        self.lines = self.duplicates = self.unknown = 0
+        self.rejected = []
+
+    def __iter__(self):
+        self.lines = self.duplicates = self.unknown = 0
+        self.rejected = []
+        seen = AsinSet()
+        seen_other = set()  # 取不到 ASIN 的链接，数量很少
+        for path, default_site in self.paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for lineno, line in enumerate(f, 1):
+                    parsed = parse_line(line, default_site)
+                    if parsed is None:
+                        if line.strip() and (default_site == self.site or default_site is None and self.warn_unknown):
+                            self.unknown += 1
+                            if len(self.rejected) < REJECT_SAMPLES:
+                                self.rejected.append(f"{path}:{lineno}: {line.strip()[:80]}")
+                        continue
+                    site, asin, url = parsed
+                    if site != self.site:
+                        continue
+                    self.lines += 1
+                    if asin:
+                        new = seen.add(asin)
+                    else:
+                        new = url not in seen_other
+                        seen_other.add(url)
+                    if not new:
+                        self.duplicates += 1
+                        continue
+                    yield url
+
+    def any(self):
+        return next(iter(self), None) is not None
+
+    def report(self):
+        name = MARKETPLACES[self.site]["name"]
+        print(f"[URL] {name}：读取 {self.lines} 条链接，重复 {self.duplicates} 条已跳过")
+        if self.unknown:
+            print(f"[WARN] {name}：{self.unknown} 行无法识别站点或 ASIN，已跳过：")
+            for sample in self.rejected:
+                print(f"    {sample}")
+            if self.unknown > len(self.rejected):
+                print(f"    ……另有 {self.unknown - len(self.rejected)} 行")